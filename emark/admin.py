@@ -0,0 +1,104 @@
+import functools
+
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+
+__all__ = ["ClickAdmin", "EstimatedCountPaginator", "OpenAdmin", "SendAdmin"]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that estimates the number of rows of large, unfiltered tables.
+
+    ``COUNT(*)`` scans the whole table. For unfiltered querysets on PostgreSQL,
+    the planner's estimate is used instead, if it exceeds the threshold.
+    All other querysets are counted exactly.
+    """
+
+    threshold = 100_000
+
+    @functools.cached_property
+    def count(self):
+        estimate = self.get_estimate()
+        if estimate is not None and estimate > self.threshold:
+            return estimate
+        return super().count
+
+    def get_estimate(self) -> int | None:
+        """Return the planner's estimate of the number of rows, if available."""
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or queryset.query.has_filters():
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class DeferredChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        return (
+            super()
+            .get_queryset(request, exclude_parameters)
+            .defer(*self.model_admin.list_defer)
+        )
+
+
+class TrackingModelAdmin(admin.ModelAdmin):
+    """Admin for large tables, that avoids full table counts and wide rows.
+
+    The admins are not registered, to not conflict with a project's own
+    admins. Register them with your admin site to use them.
+    """
+
+    date_hierarchy = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # columns, that are only loaded on the change form
+    list_defer = ()
+
+    def get_changelist(self, request, **kwargs):
+        return DeferredChangeList
+
+
+class SendAdmin(TrackingModelAdmin):
+    list_display = [
+        "subject",
+        "to",
+        "user",
+        "campaign",
+        "language",
+        "created_at",
+        "open_count",
+        "click_count",
+    ]
+    list_select_related = ["user"]
+    list_defer = ["html", "body"]
+    raw_id_fields = ["user"]
+    readonly_fields = [
+        "open_count",
+        "click_count",
+        "first_opened_at",
+        "last_clicked_at",
+    ]
+
+
+class OpenAdmin(TrackingModelAdmin):
+    list_display = ["email_id", "created_at", "ip_address", "user_agent"]
+    list_select_related = ["user_agent"]
+    list_defer = ["headers"]
+    raw_id_fields = ["email", "user_agent"]
+
+
+class ClickAdmin(TrackingModelAdmin):
+    list_display = ["email_id", "created_at", "redirect_url", "ip_address"]
+    list_defer = ["headers"]
+    raw_id_fields = ["email", "link", "user_agent"]
@@ -0,0 +1,19 @@
+from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
+
+
+class EmarkAppConfig(AppConfig):
+    name = "emark"
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .conf import get_settings
+
+        try:
+            warmup = get_settings().WARMUP
+        except ImproperlyConfigured:
+            return  # reported by the emark.E001 system check
+        if warmup:
+            from .warmup import warmup
+
+            warmup()
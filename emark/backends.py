@@ -1,20 +1,99 @@
+import itertools
+import time
 import uuid
 
 from django.core.mail import EmailMessage
 from django.core.mail.backends.console import EmailBackend as _ConsoleEmailBackend
 from django.core.mail.backends.smtp import EmailBackend as _SMTPEmailBackend
+from django.utils import translation
 
-from emark import models
+from emark import models, signals, smtp, tracing
 from emark.message import MarkdownEmail
+from emark.metrics import get_metrics
 
 __all__ = [
     "ConsoleEmailBackend",
     "SMTPEmailBackend",
     "TrackingConsoleEmailBackend",
     "TrackingSMTPEmailBackend",
+    "render_messages",
 ]
 
 
+def render_message(message, **kwargs):
+    """Render a message and record its duration or failure."""
+    metrics = get_metrics()
+    labels = {"email": type(message).__qualname__}
+    try:
+        with metrics.timer("render_duration_seconds", **labels):
+            message.render(**kwargs)
+    except Exception:
+        metrics.incr("render_failures", **labels)
+        raise
+    metrics.incr("messages_rendered", **labels)
+    metrics.observe("html_size_bytes", message.html_size, **labels)
+
+
+def render_messages(email_messages, tracking=False):
+    """Render the markdown emails of a batch, grouped by language.
+
+    Each language is activated once for all of its messages, instead of
+    switching the translation catalog message by message. The order of
+    the batch is not changed. Messages that have been rendered already
+    are skipped.
+    """
+    messages = sorted(
+        (
+            message
+            for message in email_messages
+            if isinstance(message, MarkdownEmail) and message.html is None
+        ),
+        key=lambda message: message.language or "",
+    )
+    for language, group in itertools.groupby(
+        messages, key=lambda message: message.language
+    ):
+        with translation.override(language):
+            for message in group:
+                if tracking:
+                    render_message(message, tracking_uuid=uuid.uuid4())
+                else:
+                    render_message(message)
+
+
+def send_and_measure(backend, send_messages, email_messages):
+    """Send the messages, record the batch and report its duration."""
+    metrics = get_metrics()
+    labels = {"backend": type(backend).__qualname__}
+    metrics.observe("batch_size", len(email_messages), **labels)
+    start = time.perf_counter()
+    sent = send_messages(email_messages)
+    metrics.incr("messages_sent", sent or 0, **labels)
+    if signals.messages_sent.has_listeners(type(backend)):
+        signals.messages_sent.send(
+            sender=type(backend),
+            backend=backend,
+            messages=email_messages,
+            sent=sent,
+            duration=time.perf_counter() - start,
+        )
+    return sent
+
+
+def send_with_span(backend, send, email_message):
+    """Send a message within a span, that carries its recipients and size."""
+    with tracing.start_span(
+        "emark.send", {"emark.recipients": len(email_message.recipients())}
+    ) as span:
+        sent = send(email_message)
+        # The pipelining connection records the size of the message it sent,
+        # which avoids serializing the message a second time.
+        size = getattr(backend.connection, "message_size", None)
+        if sent and size is not None:
+            span.set_attribute("emark.size", size)
+        return sent
+
+
 class RenderEmailBackendMixin:
     def __enter__(self):
         # Do not open a connection before rendering the messages
@@ -23,10 +102,8 @@ class RenderEmailBackendMixin:
         return self
 
     def send_messages(self, email_messages):
-        for message in email_messages:
-            if isinstance(message, MarkdownEmail):
-                message.render()
-        return super().send_messages(email_messages)
+        render_messages(email_messages)
+        return send_and_measure(self, super().send_messages, email_messages)
 
 
 class TrackingEmailBackendMixin:
@@ -40,16 +117,15 @@ class TrackingEmailBackendMixin:
 
     def send_messages(self, email_messages):
         self._messages_sent = []
-        for message in email_messages:
-            if isinstance(message, MarkdownEmail):
-                message.render(tracking_uuid=uuid.uuid4())
+        render_messages(email_messages, tracking=True)
         try:
-            return super().send_messages(email_messages)
+            return send_and_measure(self, super().send_messages, email_messages)
         finally:
             models.Send.objects.bulk_create(self._messages_sent)
 
     def _track_message(self, message: EmailMessage):
         if isinstance(message, MarkdownEmail):
+            utm_params = message.get_utm_params()
             self._messages_sent.append(
                 models.Send(
                     pk=message.uuid,
@@ -62,7 +138,12 @@ class TrackingEmailBackendMixin:
                     body=message.body,
                     html=message.html,
                     user=getattr(message, "user", None),
-                    utm=message.get_utm_params(),
+                    utm=utm_params,
+                    # truncated like by the migration, that added the column
+                    campaign=utm_params.get("utm_campaign", "")[
+                        : models.Send._meta.get_field("campaign").max_length
+                    ],
+                    language=message.language or "",
                 )
             )
         else:
@@ -112,10 +193,21 @@ class ConsoleEmailBackend(
     """Like the console email backend but only with the plain text body."""
 
 
-class SMTPEmailBackend(RenderEmailBackendMixin, _SMTPEmailBackend):
+class PipeliningEmailBackendMixin:
+    """Pipeline the SMTP commands of each message, if the server supports it."""
+
+    @property
+    def connection_class(self):
+        return smtp.PipeliningSMTPSSL if self.use_ssl else smtp.PipeliningSMTP
+
+
+class SMTPEmailBackend(
+    RenderEmailBackendMixin, PipeliningEmailBackendMixin, _SMTPEmailBackend
+):
     """SMTP email backend that renders messages before establishing an SMTP transport."""
 
-    pass
+    def _send(self, email_message):
+        return send_with_span(self, super()._send, email_message)
 
 
 class TrackingConsoleEmailBackend(
@@ -130,7 +222,9 @@ class TrackingConsoleEmailBackend(
             self._track_message(message)
 
 
-class TrackingSMTPEmailBackend(TrackingEmailBackendMixin, _SMTPEmailBackend):
+class TrackingSMTPEmailBackend(
+    TrackingEmailBackendMixin, PipeliningEmailBackendMixin, _SMTPEmailBackend
+):
     """Like the SMTP email backend but with click and open tracking.
 
     Furthermore, all emails are sent to a single email address.
@@ -140,9 +234,13 @@ class TrackingSMTPEmailBackend(TrackingEmailBackendMixin, _SMTPEmailBackend):
 
     def _send(self, email_message):
         sent = False
+        metrics = get_metrics()
         try:
-            sent = super()._send(email_message)
+            with metrics.timer("smtp_duration_seconds"):
+                sent = send_with_span(self, super()._send, email_message)
             return sent
         finally:
             if sent:
                 self._track_message(email_message)
+            else:
+                metrics.incr("send_failures")
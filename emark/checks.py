@@ -0,0 +1,14 @@
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+
+from emark import conf
+
+
+@checks.register
+def check_settings(app_configs, **kwargs):
+    """Validate the EMARK setting when Django starts."""
+    try:
+        conf.get_settings()
+    except ImproperlyConfigured as e:
+        return [checks.Error(str(e), id="emark.E001")]
+    return []
@@ -1,15 +1,84 @@
+import dataclasses
+import functools
+import types
+
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+__all__ = ["Settings", "get_settings"]
 
-__all__ = ["get_settings"]
 
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    """Validated eMark configuration, provided via the ``EMARK`` setting."""
 
-def get_settings():
-    return type(
-        "Settings",
-        (),
-        {
-            "UTM_PARAMS": {"utm_source": "website", "utm_medium": "email"},
-            "DOMAIN": None,
-            **getattr(settings, "EMARK", {}),
-        },
+    UTM_PARAMS: types.MappingProxyType = dataclasses.field(
+        default_factory=lambda: {"utm_source": "website", "utm_medium": "email"}
     )
+    DOMAIN: str | None = None
+    SIGNED_TRACKING_URLS: bool = False
+    SHORT_LINKS: bool = False
+    TRACKING_CACHE: str = "default"
+    TRACKING_DEDUPLICATION_WINDOW: int | None = None
+    TRACKING_HEADERS: tuple[str, ...] = ("User-Agent", "Referer")
+    TRACKING_HEADERS_SAMPLE_RATE: int | None = None
+    TRACKING_IGNORED_USER_AGENTS: tuple[str, ...] = ()
+    TRACKING_IGNORED_IP_PREFIXES: tuple[str, ...] = ()
+    TRACKING_FILTERS: tuple[str, ...] = ()
+    TRACKING_FILTER_ACTION: str = "drop"
+    WARMUP: bool = False
+    METRICS: str = "emark.metrics.Metrics"
+    PROFILE_SAMPLE_RATE: int | None = None
+    MINIFY_HTML: bool = False
+    # Gmail clips messages with more than 102KB of HTML
+    HTML_SIZE_BUDGET: int | None = 102 * 1024
+    PREVIEW_CACHE: str = "default"
+    PREVIEW_CACHE_TIMEOUT: int | None = None
+
+    def __post_init__(self):
+        for field in dataclasses.fields(self):
+            value = getattr(self, field.name)
+            if field.type is types.MappingProxyType:
+                if not isinstance(value, dict | types.MappingProxyType):
+                    self._invalid(field.name, "a dictionary")
+                value = types.MappingProxyType(dict(value))
+            elif field.type == tuple[str, ...]:
+                if isinstance(value, str) or not all(
+                    isinstance(item, str) for item in value
+                ):
+                    self._invalid(field.name, "a list of strings")
+                value = tuple(value)
+            elif field.type == int | None:
+                if value is not None and (
+                    isinstance(value, bool) or not isinstance(value, int)
+                ):
+                    self._invalid(field.name, "an integer or None")
+            elif not isinstance(value, field.type):
+                type_name = getattr(field.type, "__name__", field.type)
+                self._invalid(field.name, f"of type {type_name}")
+            object.__setattr__(self, field.name, value)
+        if self.TRACKING_FILTER_ACTION not in ["drop", "count"]:
+            self._invalid("TRACKING_FILTER_ACTION", "either 'drop' or 'count'")
+
+    @staticmethod
+    def _invalid(name, expected):
+        raise ImproperlyConfigured(f"EMARK['{name}'] must be {expected}.")
+
+
+@functools.cache
+def get_settings() -> Settings:
+    """Return the eMark settings, which are cached until the settings change."""
+    options = getattr(settings, "EMARK", {})
+    if unknown := options.keys() - {f.name for f in dataclasses.fields(Settings)}:
+        raise ImproperlyConfigured(
+            f"Unknown EMARK setting(s): {', '.join(sorted(unknown))}"
+        )
+    return Settings(**options)
+
+
+@receiver(setting_changed)
+def reset_settings(*, setting, **kwargs):
+    if setting == "EMARK":
+        get_settings.cache_clear()
@@ -7,6 +7,7 @@ app_name = "emark-dashboard"
 
 urlpatterns = [
     path("", staff_member_required(views.DashboardView.as_view()), name="dashboard"),
+    path("profile", staff_member_required(views.ProfileView.as_view()), name="profile"),
     path(
         "<str:email_class>/",
         include(
@@ -15,7 +16,12 @@ urlpatterns = [
                     "preview",
                     staff_member_required(views.EmailPreviewView.as_view()),
                     name="email-preview",
-                )
+                ),
+                path(
+                    "preview.html",
+                    staff_member_required(views.EmailPreviewHTMLView.as_view()),
+                    name="email-preview-html",
+                ),
             ]
         ),
     ),
@@ -1,7 +1,12 @@
-from django.http import Http404
+from django.http import Http404, HttpResponse
 from django.urls import reverse
+from django.utils import translation
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.clickjacking import xframe_options_sameorigin
 from django.views.generic import TemplateView
 
+from ... import profiling
 from ...message import MarkdownEmail
 from . import _registry
 
@@ -13,7 +18,7 @@ def serialize_email_class(email_class: type[MarkdownEmail], path: str) -> {str:
         "name": email_class.__name__,
         "doc": email_class.__doc__ or "",
         "detail_url": reverse("emark-dashboard:email-preview", args=[path]),
-        "preview": email_class.render_preview,
+        "preview_url": reverse("emark-dashboard:email-preview-html", args=[path]),
     }
 
 
@@ -30,6 +35,7 @@ class DashboardView(TemplateView):
             "emails": [
                 serialize_email_class(klass, path) for path, klass in _registry.items()
             ],
+            "profiles": profiling.get_samples(),
         }
 
 
@@ -56,3 +62,36 @@ class EmailPreviewView(TemplateView):
                 self.email_class, self.kwargs["email_class"]
             ),
         }
+
+
+@method_decorator(xframe_options_sameorigin, name="dispatch")
+class EmailPreviewHTMLView(View):
+    """Return the cached HTML preview of an email, to be loaded in an iframe."""
+
+    def get(self, request, *args, **kwargs):
+        try:
+            email_class = _registry[kwargs["email_class"]]
+        except KeyError as e:
+            raise Http404() from e
+        language = request.GET.get("language") or translation.get_language()
+        if not translation.check_for_language(language):
+            raise Http404()
+        return HttpResponse(email_class.render_preview(language))
+
+
+class ProfileView(View):
+    """Download the sampled render profiles as pstats or collapsed stacks."""
+
+    def get(self, request, *args, **kwargs):
+        stats = profiling.get_stats(request.GET.get("email"))
+        if stats is None:
+            raise Http404()
+        if request.GET.get("format") == "collapsed":
+            return HttpResponse(
+                profiling.to_collapsed(stats), content_type="text/plain; charset=utf-8"
+            )
+        return HttpResponse(
+            profiling.to_pstats(stats),
+            content_type="application/octet-stream",
+            headers={"Content-Disposition": 'attachment; filename="emark.prof"'},
+        )
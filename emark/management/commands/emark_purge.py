@@ -0,0 +1,144 @@
+import argparse
+import datetime
+import gzip
+import json
+import re
+import time
+
+from django.core.management import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from emark import models
+
+AGE_RE = re.compile(r"^(?P<value>\d+)(?P<unit>[hdw])$")
+AGE_UNITS = {"h": "hours", "d": "days", "w": "weeks"}
+
+
+def age(value):
+    """Parse an age like ``180d`` into a timedelta."""
+    match = AGE_RE.match(value)
+    if not match:
+        raise argparse.ArgumentTypeError(
+            f"Invalid age '{value}', use e.g. 12h, 180d or 4w."
+        )
+    return datetime.timedelta(
+        **{AGE_UNITS[match["unit"]]: int(match["value"])},
+    )
+
+
+class Command(BaseCommand):
+    help = "Delete sent emails, opens and clicks older than the given age."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=age,
+            required=True,
+            help="Purge emails sent before this age, e.g. 12h, 180d or 4w.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows deleted per query (default: 1000).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches (default: 0.1).",
+        )
+        parser.add_argument(
+            "--archive",
+            default=None,
+            help="Write the purged rows to this gzip compressed JSON Lines file.",
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        self.using = options["database"]
+        self.batch_size = options["batch_size"]
+        self.sleep = options["sleep"]
+        cutoff = timezone.now() - options["older_than"]
+        queryset = (
+            models.Send.objects.using(self.using)
+            .filter(created_at__lt=cutoff)
+            .order_by("created_at")
+        )
+        # Append to an existing archive, gzip supports concatenated members.
+        archive = options["archive"] and gzip.open(options["archive"], "at")
+        count = 0
+        try:
+            while pks := list(queryset.values_list("pk", flat=True)[: self.batch_size]):
+                # Archive the rows before anything is deleted. If a delete
+                # fails, the rows are archived again by the next run.
+                if archive:
+                    archive.writelines(self.serialize(pks))
+                    archive.flush()
+                # Delete the children first, in batches that commit on their
+                # own, to keep transactions and locks short.
+                for model in [models.Open, models.Click]:
+                    self.purge(model.objects.filter(email__in=pks))
+                # The children are gone, which allows a single DELETE query,
+                # without the ORM fetching the emails and their bodies first.
+                count += (
+                    models.Send.objects.filter(pk__in=pks)
+                    .order_by()
+                    ._raw_delete(self.using)
+                )
+                time.sleep(self.sleep)
+        finally:
+            if archive:
+                archive.close()
+        links = self.purge_links(cutoff)
+        self.stdout.write(f"Purged {count} emails and {links} links.")
+
+    def purge(self, queryset):
+        """Delete the rows of a queryset in batches and return their number."""
+        queryset = queryset.using(self.using).order_by()
+        count = 0
+        while pks := list(queryset.values_list("pk", flat=True)[: self.batch_size]):
+            # Opens and clicks have no dependent rows, so that the ORM
+            # deletes them with a single query without fetching them.
+            _, deleted = queryset.filter(pk__in=pks).delete()
+            count += deleted.get(queryset.model._meta.label, 0)
+            time.sleep(self.sleep)
+        return count
+
+    def purge_links(self, cutoff):
+        """Delete links, that no email sent after the cutoff might contain."""
+        queryset = (
+            models.Link.objects.using(self.using)
+            .filter(
+                # links are used from the cache after their last lookup
+                last_used_at__lt=cutoff
+                - datetime.timedelta(seconds=models.LINK_CACHE_TIMEOUT),
+            )
+            .filter(~Exists(models.Click.objects.filter(link=OuterRef("pk"))))
+            .order_by()
+        )
+        count = 0
+        while pks := list(queryset.values_list("pk", flat=True)[: self.batch_size]):
+            # A single DELETE query, that skips links clicked in the meantime.
+            count += queryset.filter(pk__in=pks)._raw_delete(self.using)
+            time.sleep(self.sleep)
+        return count
+
+    def serialize(self, pks):
+        """Yield the rows of a batch of emails as JSON lines for the archive."""
+        for model, queryset in [
+            (models.Send, models.Send.objects.filter(pk__in=pks)),
+            (models.Open, models.Open.objects.filter(email__in=pks)),
+            (models.Click, models.Click.objects.filter(email__in=pks)),
+        ]:
+            for row in queryset.using(self.using).values().iterator():
+                yield (
+                    json.dumps(
+                        {"model": model._meta.label_lower, "fields": row},
+                        cls=DjangoJSONEncoder,
+                    )
+                    + "\n"
+                )
@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from emark import models
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized open and click counters of sent emails."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Only reconcile emails sent within the last number of days.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of emails updated per query (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        queryset = models.Send.objects.order_by("pk")
+        if options["days"] is not None:
+            queryset = queryset.filter(
+                created_at__gte=timezone.now()
+                - datetime.timedelta(days=options["days"])
+            )
+        count = 0
+        while pks := list(
+            queryset.values_list("pk", flat=True)[: options["batch_size"]]
+        ):
+            count += models.Send.objects.filter(pk__in=pks).reconcile()
+            queryset = queryset.filter(pk__gt=pks[-1])
+        self.stdout.write(f"Reconciled {count} emails.")
@@ -0,0 +1,88 @@
+import collections
+import datetime
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, Min
+from django.utils import timezone
+
+from emark import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregate sent, opened and clicked emails into daily rollups"
+        " per campaign and language."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=datetime.date.fromisoformat,
+            default=None,
+            help="Reprocess all days since the given date (YYYY-MM-DD)."
+            " Defaults to the last day that has been rolled up.",
+        )
+
+    def handle(self, *args, **options):
+        start = options["since"] or self.get_watermark()
+        if start is None:
+            self.stdout.write("Nothing to roll up.")
+            return
+        end = timezone.localdate()
+        day = start
+        while day <= end:
+            count = self.rollup_day(day)
+            self.stdout.write(f"Rolled up {count} rows for {day.isoformat()}.")
+            day += datetime.timedelta(days=1)
+
+    def get_watermark(self):
+        """Return the first day that needs to be (re)processed.
+
+        The last day that has been rolled up is always processed again,
+        since it might have been incomplete during the previous run.
+        """
+        watermark = models.DailyRollup.objects.aggregate(date=Max("date"))["date"]
+        if watermark is None:
+            first_send = models.Send.objects.aggregate(created_at=Min("created_at"))[
+                "created_at"
+            ]
+            if first_send is not None:
+                watermark = timezone.localdate(first_send)
+        return watermark
+
+    def rollup_day(self, day):
+        """Replace the rollup rows of a single day and return their number."""
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+        end = start + datetime.timedelta(days=1)
+        rows = collections.defaultdict(dict)
+        sends = (
+            models.Send.objects.filter(created_at__gte=start, created_at__lt=end)
+            .values("campaign", "language")
+            .annotate(count=Count("pk"))
+            .order_by()
+        )
+        for row in sends:
+            rows[row["campaign"], row["language"]]["sends"] = row["count"]
+        for field, model in [
+            ("unique_opens", models.Open),
+            ("unique_clicks", models.Click),
+        ]:
+            events = (
+                model.objects.filter(created_at__gte=start, created_at__lt=end)
+                .values(campaign=F("email__campaign"), language=F("email__language"))
+                .annotate(count=Count("email", distinct=True))
+                .order_by()
+            )
+            for row in events:
+                rows[row["campaign"], row["language"]][field] = row["count"]
+
+        with transaction.atomic():
+            models.DailyRollup.objects.filter(date=day).delete()
+            models.DailyRollup.objects.bulk_create(
+                models.DailyRollup(
+                    date=day, campaign=campaign, language=language, **counts
+                )
+                for (campaign, language), counts in rows.items()
+            )
+        return len(rows)
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from emark.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompile the templates of registered emails"
+        " and load the translation catalogs."
+    )
+
+    def handle(self, *args, **options):
+        email_count, language_count = warmup()
+        self.stdout.write(
+            f"Warmed up {email_count} emails in {language_count} languages."
+        )
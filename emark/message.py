@@ -1,27 +1,198 @@
 from __future__ import annotations
 
+import contextlib
+import dataclasses
+import functools
+import hashlib
 import logging
 import re
+import time
+import uuid
 from urllib import parse
 
-import markdown
-import premailer
 from django.apps import apps
 from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
 from django.core.exceptions import ImproperlyConfigured
 from django.core.mail import EmailMultiAlternatives
+from django.core.signals import setting_changed
+from django.db.models import Q
+from django.dispatch import receiver
 from django.template import loader
-from django.urls import reverse
-from django.utils import translation
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.urls import get_script_prefix, reverse
+from django.utils import autoreload, translation
 from django.utils.safestring import mark_safe
 
-from emark import conf, utils
+from emark import conf, profiling, signals, tracing, tracking, utils
 
 INLINE_LINK_RE = re.compile(r"\[[^\]]+\]\(([^)]+)\)")
 INLINE_HTML_LINK_RE = re.compile(r"href=\"([^\"]+)\"")
 CLS_NAME_TO_CAMPAIGN_RE = re.compile(
     r".+?(?:(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|$)"
 )
+MARKDOWN_EXTENSIONS = [
+    "markdown.extensions.meta",
+    "markdown.extensions.tables",
+    "markdown.extensions.extra",
+]
+# user fields read by to_user, if the user model has them, besides the email field
+USER_FIELDS = ["is_active", "first_name", "last_name", "language"]
+# placeholder to reverse the tracking URLs once, see EmailSpec
+UUID_PLACEHOLDER = str(uuid.UUID(int=0))
+
+_specs = {}
+
+logger = logging.getLogger(__name__)
+
+
+class EmailSpec:
+    """Facts about an email class that are the same for every message.
+
+    All values are computed lazily and cached per class, until the settings
+    or templates change.
+    """
+
+    def __init__(self, email_class: type[MarkdownEmail]):
+        self.email_class = email_class
+        self.tracking_paths = {}
+
+    @functools.cached_property
+    def campaign_name(self) -> str:
+        return "_".join(
+            m.group(0)
+            for m in CLS_NAME_TO_CAMPAIGN_RE.finditer(self.email_class.__qualname__)
+        ).upper()
+
+    @functools.cached_property
+    def utm_params(self) -> {str: str}:
+        return dict(conf.get_settings().UTM_PARAMS) | {
+            "utm_campaign": self.email_class.get_utm_campaign_name(),
+        }
+
+    @functools.cached_property
+    def template(self):
+        return loader.get_template(self.email_class.template)
+
+    @functools.cached_property
+    def base_template(self):
+        return loader.get_template(self.email_class.base_html_template)
+
+    def get_template(self, template_name):
+        """Return a compiled template, cached for the class's default templates."""
+        if template_name == self.email_class.template:
+            return self.template
+        if template_name == self.email_class.base_html_template:
+            return self.base_template
+        return loader.get_template(template_name)
+
+    @functools.cached_property
+    def template_version(self) -> str:
+        """Return a hash of the sources of the templates and their dependencies."""
+        sources = hashlib.sha256()
+        for template in get_template_dependencies(
+            self.template.template, self.base_template.template
+        ):
+            sources.update(template.source.encode())
+        return sources.hexdigest()
+
+    def get_tracking_paths(self) -> {str: str}:
+        """Return the paths of the tracking views for the active language.
+
+        The paths are cached per language and script prefix, since both
+        change the reversed URLs, e.g. with ``i18n_patterns``.
+        """
+        key = translation.get_language(), get_script_prefix()
+        try:
+            return self.tracking_paths[key]
+        except KeyError:
+            paths = self.tracking_paths[key] = {
+                name: reverse(f"emark:{name}", kwargs={"pk": UUID_PLACEHOLDER})
+                for name in ["email-detail", "email-click", "email-open"]
+            }
+            return paths
+
+    def get_tracking_path(self, name, pk):
+        """Return the path of a tracking view without resolving the URLconf."""
+        return self.get_tracking_paths()[name].replace(UUID_PLACEHOLDER, str(pk))
+
+
+@receiver(setting_changed)
+def reset_specs(*, setting, **kwargs):
+    if setting in ["EMARK", "TEMPLATES", "ROOT_URLCONF", "INSTALLED_APPS"]:
+        _specs.clear()
+
+
+@receiver(autoreload.file_changed)
+def reset_specs_on_file_change(**kwargs):
+    # The development server's autoreloader might reload changed templates.
+    _specs.clear()
+
+
+def get_template_dependencies(*templates):
+    """Return the templates and the constant templates they extend or include."""
+    dependencies = []
+    seen = set()
+    pending = list(templates)
+    while pending:
+        template = pending.pop(0)
+        origin = template.origin.name, id(template.origin.loader)
+        if origin in seen:
+            continue
+        seen.add(origin)
+        dependencies.append(template)
+        names = [
+            *(
+                node.parent_name.var
+                for node in template.nodelist.get_nodes_by_type(ExtendsNode)
+            ),
+            *(
+                node.template.var
+                for node in template.nodelist.get_nodes_by_type(IncludeNode)
+            ),
+        ]
+        # names of templates, that are resolved at render time, are unknown
+        for name in filter(lambda name: isinstance(name, str), names):
+            if name == template.origin.template_name:
+                # a template that extends a template of the same name
+                pending.append(
+                    template.engine.find_template(name, skip=[template.origin])[0]
+                )
+            else:
+                pending.append(template.engine.get_template(name))
+    return dependencies
+
+
+def is_web_url(url):
+    """Return whether the URL is a web link, that may be tracked."""
+    try:
+        return parse.urlparse(url).scheme.lower() in ["http", "https", ""]
+    except ValueError:
+        return False
+
+
+@dataclasses.dataclass
+class BulkResult:
+    """Number of sent, failed and skipped messages of a bulk send."""
+
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+
+def inline_css(html):
+    """Inline the CSS of style tags into the style attributes of the HTML."""
+    # premailer, cssutils and lxml are slow to import and not needed
+    # by workers that only serve the tracking views
+    import premailer
+
+    return premailer.transform(
+        html=html,
+        strip_important=False,
+        keep_style_tags=True,
+        cssutils_logging_level=logging.ERROR,
+    )
 
 
 class MarkdownEmail(EmailMultiAlternatives):
@@ -61,13 +232,16 @@ class MarkdownEmail(EmailMultiAlternatives):
         self.subject = subject or self.subject
         self.preheader = preheader or self.preheader
         self.html = None
+        self.html_size = None
         self.markdown = None
+        self.short_links = {}
         super().__init__(subject=self.subject, **kwargs)
 
     @classmethod
     def to_user(cls, user=None, context=None, language=None, **kwargs):
         """Return email with user specific language, context and recipient."""
-        if not user.email:
+        email = getattr(user, user.get_email_field_name())
+        if not email:
             raise ValueError("User has no email address")
         if not user.is_active:
             raise ValueError("User is not active")
@@ -86,7 +260,7 @@ class MarkdownEmail(EmailMultiAlternatives):
         }
         obj = cls(
             **{
-                "to": [f'"{user.get_full_name()}" <{user.email}>'],
+                "to": [f'"{user.get_full_name()}" <{email}>'],
                 "context": context,
                 "language": language,
             }
@@ -95,68 +269,191 @@ class MarkdownEmail(EmailMultiAlternatives):
         obj.user = user
         return obj
 
+    @classmethod
+    def to_users(
+        cls,
+        queryset,
+        context_fn=None,
+        fields=(),
+        select_related=(),
+        chunk_size=2000,
+        **kwargs,
+    ):
+        """Yield an email for each active user with an email address.
+
+        Inactive users and users without an email address are excluded in SQL.
+        Only the email field and the fields of Django's default user model used
+        by :meth:`to_user` are loaded. Templates that use other fields or
+        relations of the user, as well as user models that override
+        ``get_full_name`` or ``get_short_name``, must declare the fields they
+        read via ``fields`` and ``select_related``. Otherwise, each user causes
+        another query. Users for which ``context_fn(user)`` returns ``None``
+        are skipped.
+        """
+        model = queryset.model
+        model_fields = {field.name for field in model._meta.get_fields()}
+        email_field = model.get_email_field_name()
+        if "is_active" in model_fields:
+            queryset = queryset.filter(is_active=True)
+        queryset = (
+            queryset.exclude(
+                Q(**{email_field: ""}) | Q(**{f"{email_field}__isnull": True})
+            )
+            .select_related(*select_related)
+            .only(
+                email_field,
+                *(name for name in USER_FIELDS if name in model_fields),
+                *fields,
+                *select_related,
+            )
+        )
+        for user in queryset.iterator(chunk_size=chunk_size):
+            context = context_fn(user) if context_fn else {}
+            if context is not None:
+                yield cls.to_user(user, context=context, **kwargs)
+
+    @classmethod
+    def send_bulk(
+        cls,
+        queryset,
+        context_fn=None,
+        chunk_size=500,
+        connection=None,
+        fail_silently=False,
+        **kwargs,
+    ) -> BulkResult:
+        """Send the email to all users of a queryset, one chunk at a time.
+
+        Emails are built via :meth:`to_users` and each chunk is rendered and
+        sent, before the next chunk is fetched. The connection is only opened
+        once the first chunk has been rendered, and all chunks are sent via
+        the same connection. Users for which ``context_fn(user)`` returns
+        ``None`` are counted as skipped.
+        """
+        result = BulkResult()
+
+        def get_context(user):
+            context = context_fn(user) if context_fn else {}
+            if context is None:
+                result.skipped += 1
+            return context
+
+        connection = connection or mail.get_connection(fail_silently=fail_silently)
+        new_conn_created = False
+        try:
+            messages = []
+            for message in cls.to_users(
+                queryset, context_fn=get_context, chunk_size=chunk_size, **kwargs
+            ):
+                messages.append(message)
+                if len(messages) >= chunk_size:
+                    new_conn_created |= cls._send_chunk(connection, messages, result)
+                    messages = []
+            if messages:
+                new_conn_created |= cls._send_chunk(connection, messages, result)
+        finally:
+            if new_conn_created:
+                connection.close()
+        return result
+
+    @staticmethod
+    def _send_chunk(connection, messages, result):
+        """Render and send a chunk, return whether a connection was opened."""
+        from emark import backends
+
+        backends.render_messages(
+            messages,
+            tracking=isinstance(connection, backends.TrackingEmailBackendMixin),
+        )
+        # Only open the connection after rendering, to avoid connection timeouts.
+        new_conn_created = bool(connection.open())
+        sent = connection.send_messages(messages) or 0
+        result.sent += sent
+        result.failed += len(messages) - sent
+        return new_conn_created
+
     def message(self, **kwargs):
         # The connection will call .message while sending the email.
         self.render()
         return super().message(**kwargs)
 
+    @classmethod
+    def get_spec(cls) -> EmailSpec:
+        """Return the cached facts about this email class."""
+        try:
+            return _specs[cls]
+        except KeyError:
+            spec = _specs[cls] = EmailSpec(cls)
+            return spec
+
     @classmethod
     def get_utm_campaign_name(cls):
         """Return the UTM campaign name for this email."""
-        return "_".join(
-            m.group(0) for m in CLS_NAME_TO_CAMPAIGN_RE.finditer(cls.__qualname__)
-        ).upper()
+        return cls.get_spec().campaign_name
 
-    def update_url_params(self, url, **params):
-        """Add UTM parameters to a URL and add the click tracking URL."""
-        redirect_url_parts = parse.urlparse(url)
-        url_params = dict(parse.parse_qsl(redirect_url_parts.query))
+    def add_url_params(self, url, **params):
+        """Add parameters to a URL, unless they are already present."""
+        url_parts = parse.urlparse(url)
+        url_params = dict(parse.parse_qsl(url_parts.query))
         params.update(url_params)
         url_new_query = parse.urlencode(params)
-        redirect_url_parts = redirect_url_parts._replace(query=url_new_query)
-        redirect_url = parse.urlunparse(redirect_url_parts)
+        url_parts = url_parts._replace(query=url_new_query)
+        return parse.urlunparse(url_parts)
+
+    def update_url_params(self, url, **params):
+        """Add UTM parameters to a URL and add the click tracking URL."""
+        redirect_url = self.add_url_params(url, **params)
         if not self.uuid:
             return redirect_url
         site_url = self.get_site_url()
+        emark_settings = conf.get_settings()
 
-        # ignore external links
-        if (
-            redirect_url_parts.netloc
-            and redirect_url_parts.netloc != parse.urlparse(site_url).netloc
-        ):
+        if emark_settings.SHORT_LINKS:
+            if redirect_url not in self.short_links:
+                from emark.models import Link
+
+                self.short_links |= Link.objects.get_short_ids(
+                    self.get_utm_params().get("utm_campaign", ""), [redirect_url]
+                )
+            tracking_url = reverse(
+                "emark:email-link",
+                kwargs={
+                    "pk": self.uuid,
+                    "link": tracking.sign_link(
+                        self.uuid, self.short_links[redirect_url]
+                    ),
+                },
+            )
+            return parse.urljoin(site_url, tracking_url)
+
+        # ignore external links, unless they are signed and safe to redirect to
+        netloc = parse.urlparse(redirect_url).netloc
+        signed = emark_settings.SIGNED_TRACKING_URLS
+        if not signed and netloc and netloc != parse.urlparse(site_url).netloc:
             return redirect_url
-        tracking_url = reverse("emark:email-click", kwargs={"pk": self.uuid})
+        tracking_url = self.get_spec().get_tracking_path("email-click", self.uuid)
         tracking_url = parse.urljoin(site_url, tracking_url)
         tracking_url_parts = parse.urlparse(tracking_url)
-        tracking_url_parts = tracking_url_parts._replace(
-            query=parse.urlencode({"url": redirect_url})
-        )
+        query = {"url": redirect_url}
+        if signed:
+            query["sig"] = tracking.sign_url(self.uuid, redirect_url)
+        tracking_url_parts = tracking_url_parts._replace(query=parse.urlencode(query))
         return parse.urlunparse(tracking_url_parts)
 
     def inject_utm_params(self, md, **utm):
-        for url in INLINE_LINK_RE.findall(md):
-            try:
-                url_parts = parse.urlparse(url)
-                if url_parts.scheme.lower() not in [
-                    "http",
-                    "https",
-                    "",
-                ]:
-                    continue
-            except ValueError:
-                continue
+        md_urls = list(filter(is_web_url, INLINE_LINK_RE.findall(md)))
+        html_urls = list(filter(is_web_url, INLINE_HTML_LINK_RE.findall(md)))
+        if self.uuid and conf.get_settings().SHORT_LINKS:
+            # create all links of the email at once
+            from emark.models import Link
+
+            self.short_links |= Link.objects.get_short_ids(
+                utm.get("utm_campaign", ""),
+                [self.add_url_params(url, **utm) for url in {*md_urls, *html_urls}],
+            )
+        for url in md_urls:
             md = md.replace(f"({url})", f"({self.update_url_params(url, **utm)})")
-        for url in INLINE_HTML_LINK_RE.findall(md):
-            try:
-                url_parts = parse.urlparse(url)
-                if url_parts.scheme.lower() not in [
-                    "http",
-                    "https",
-                    "",
-                ]:
-                    continue
-            except ValueError:
-                continue
+        for url in html_urls:
             md = md.replace(
                 f'href="{url}"', f'href="{self.update_url_params(url, **utm)}"'
             )
@@ -182,27 +479,21 @@ class MarkdownEmail(EmailMultiAlternatives):
 
     def get_utm_params(self) -> {str: str}:
         """Return a dictionary of UTM parameters."""
-        return (
-            conf.get_settings().UTM_PARAMS
-            | {
-                "utm_campaign": self.get_utm_campaign_name(),
-            }
-            | self.utm_params
-        )
+        return self.get_spec().utm_params | self.utm_params
 
     def get_context_data(self):
         """Return the context data for the email."""
         context = {}
         if self.uuid:
+            spec = self.get_spec()
+            site_url = self.get_site_url()
             context |= {
                 "tracking_uuid": self.uuid,
                 "view_in_browser_url": parse.urljoin(
-                    self.get_site_url(),
-                    reverse("emark:email-detail", kwargs={"pk": self.uuid}),
+                    site_url, spec.get_tracking_path("email-detail", self.uuid)
                 ),
                 "tracking_pixel_url": parse.urljoin(
-                    self.get_site_url(),
-                    reverse("emark:email-open", kwargs={"pk": self.uuid}),
+                    site_url, spec.get_tracking_path("email-open", self.uuid)
                 ),
             }
 
@@ -227,32 +518,48 @@ class MarkdownEmail(EmailMultiAlternatives):
         """
         return (self.preheader or "") % context
 
+    def measure(self, stage, func, *args, **kwargs):
+        """Call a render stage and send its duration, if anyone is listening."""
+        with tracing.start_span(f"emark.render.{stage}"):
+            if not signals.stage_rendered.has_listeners(type(self)):
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+        signals.stage_rendered.send(
+            sender=type(self),
+            message=self,
+            stage=stage,
+            duration=time.perf_counter() - start,
+            size=len(result.encode()),
+            language=self.language,
+        )
+        return result
+
     def get_markdown(self, context, utm):
-        template = self.get_template()
-        markdown_string = loader.get_template(template).render(context)
-        return self.inject_utm_params(markdown_string, **utm)
+        template = self.get_spec().get_template(self.get_template())
+        markdown_string = self.measure("template", template.render, context)
+        return self.measure("utm", self.inject_utm_params, markdown_string, **utm)
 
     def get_html(self, markdown_string, context):
-        html_message = markdown.markdown(
+        import markdown
+
+        html_message = self.measure(
+            "markdown",
+            markdown.markdown,
             markdown_string,
-            extensions=[
-                "markdown.extensions.meta",
-                "markdown.extensions.tables",
-                "markdown.extensions.extra",
-            ],
+            extensions=MARKDOWN_EXTENSIONS,
         )
         context["markdown_string"] = mark_safe(html_message)  # noqa: S308
 
-        template = loader.get_template(self.base_html_template)
-        rendered_html = template.render(context)
+        template = self.get_spec().get_template(self.base_html_template)
+        rendered_html = self.measure("layout", template.render, context)
 
-        inlined_html = premailer.transform(
-            html=rendered_html,
-            strip_important=False,
-            keep_style_tags=True,
-            cssutils_logging_level=logging.ERROR,
-        )
-        return inlined_html
+        html = self.measure("inline", inline_css, rendered_html)
+        if conf.get_settings().MINIFY_HTML:
+            html = self.measure("minify", utils.minify_html, html)
+            # Minified HTML might exceed the line length limit of RFC 5322.
+            html = utils.wrap_lines(html)
+        return html
 
     def get_body(self, html):
         """Return the parsed plain text version of the rendered HTML email."""
@@ -265,7 +572,17 @@ class MarkdownEmail(EmailMultiAlternatives):
         """Render the email."""
         if self.html is None:
             self.uuid = tracking_uuid
-            with translation.override(self.language):
+            with (
+                profiling.profile(type(self)),
+                tracing.start_span(
+                    "emark.render",
+                    {
+                        "emark.email": type(self).__qualname__,
+                        "emark.language": self.language,
+                    },
+                ),
+                self.override_language(),
+            ):
                 utm_params = self.get_utm_params()
                 context = self.get_context_data()
                 context |= utm_params
@@ -277,22 +594,62 @@ class MarkdownEmail(EmailMultiAlternatives):
                     markdown_string=self.markdown,
                     context=context,
                 )
-                self.body = self.get_body(self.html)
+                self.body = self.measure("text", self.get_body, self.html)
                 self.attach_alternative(self.html, "text/html")
+                self.check_html_size()
+
+    def override_language(self):
+        """Activate the email's language, unless it is already active."""
+        if self.language and translation.get_language() == translation.to_language(
+            self.language
+        ):
+            return contextlib.nullcontext()
+        return translation.override(self.language)
+
+    def check_html_size(self):
+        """Store the size of the HTML and warn if it exceeds the budget."""
+        self.html_size = len(self.html.encode())
+        budget = conf.get_settings().HTML_SIZE_BUDGET
+        if budget and self.html_size > budget:
+            logger.warning(
+                "%s has %d bytes of HTML, which exceeds the budget of %d bytes.",
+                type(self).__qualname__,
+                self.html_size,
+                budget,
+            )
 
     @classmethod
-    def render_preview(cls):
-        """Return a preview of the email."""
-        markdown_string = loader.get_template(cls.template).template.source
+    def render_preview(cls, language=None):
+        """Return a preview of the email, which is cached until its templates change."""
+        language = language or translation.get_language()
+        spec = cls.get_spec()
+        emark_settings = conf.get_settings()
+        cache = caches[emark_settings.PREVIEW_CACHE]
+        key = ":".join(
+            [
+                "emark:preview",
+                f"{cls.__module__}.{cls.__qualname__}",
+                language or "",
+                spec.template_version,
+            ]
+        )
+        if (preview := cache.get(key)) is None:
+            with translation.override(language):
+                preview = cls.build_preview()
+            cache.set(key, preview, emark_settings.PREVIEW_CACHE_TIMEOUT)
+        return preview
+
+    @classmethod
+    def build_preview(cls):
+        """Render the markdown template's source into the base template."""
+        import markdown
+
+        spec = cls.get_spec()
+        markdown_string = spec.template.template.source
         context = {}
         html_message = markdown.markdown(
             markdown_string,
-            extensions=[
-                "markdown.extensions.meta",
-                "markdown.extensions.tables",
-                "markdown.extensions.extra",
-            ],
+            extensions=MARKDOWN_EXTENSIONS,
         )
         context["markdown_string"] = mark_safe(html_message)  # noqa: S308
-        template = loader.get_template(cls.base_html_template)
-        return template.render(context)
+        return spec.base_template.render(context)
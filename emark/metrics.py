@@ -0,0 +1,152 @@
+"""Metrics about rendered and sent emails, as well as tracked events.
+
+The metrics sink is configured via the ``METRICS`` setting. The default sink
+discards all metrics, which only adds a function call per recorded value.
+"""
+
+import bisect
+import contextlib
+import dataclasses
+import functools
+import threading
+import time
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from emark import conf
+
+__all__ = ["InMemoryMetrics", "Metrics", "PrometheusMetrics", "get_metrics"]
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+BYTES_BUCKETS = (10_000, 25_000, 50_000, 75_000, 102 * 1024, 150_000, 250_000)
+
+
+class Metrics:
+    """Metrics sink that discards all values, subclasses store them."""
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        """Increment a counter, e.g. the number of sent messages."""
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record a value of a histogram, e.g. a duration in seconds."""
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """Record the duration of the block, unless it raises an exception."""
+        start = time.perf_counter()
+        yield
+        self.observe(name, time.perf_counter() - start, **labels)
+
+
+@dataclasses.dataclass
+class Histogram:
+    """Cumulative distribution of the observed values."""
+
+    buckets: tuple
+    counts: list
+    sum: float = 0
+    count: int = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class InMemoryMetrics(Metrics):
+    """Keep counters and histograms in memory of the current process."""
+
+    buckets = {"batch_size": SIZE_BUCKETS, "html_size_bytes": BYTES_BUCKETS}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def incr(self, name, value=1, **labels):
+        key = name, tuple(sorted(labels.items()))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = name, tuple(sorted(labels.items()))
+        with self.lock:
+            try:
+                histogram = self.histograms[key]
+            except KeyError:
+                buckets = self.buckets.get(name, DURATION_BUCKETS)
+                histogram = self.histograms[key] = Histogram(
+                    buckets, [0] * (len(buckets) + 1)
+                )
+            histogram.observe(value)
+
+    def get_counter(self, name: str, **labels) -> float:
+        """Return the current value of a counter."""
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def get_histogram(self, name: str, **labels) -> Histogram | None:
+        """Return the histogram of the observed values, if any."""
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    values = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"),
+        )
+        for key, value in labels
+    )
+    return f"{{{values}}}"
+
+
+class PrometheusMetrics(InMemoryMetrics):
+    """Keep metrics in memory and render them in the Prometheus text format."""
+
+    prefix = "emark_"
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        types = set()
+        for (name, labels), value in counters:
+            name = f"{self.prefix}{name}_total"
+            if name not in types:
+                types.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            name = f"{self.prefix}{name}"
+            if name not in types:
+                types.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bucket, count in zip(
+                [*histogram.buckets, "+Inf"], histogram.counts, strict=True
+            ):
+                cumulative += count
+                bucket_labels = format_labels([*labels, ("le", bucket)])
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+@functools.cache
+def get_metrics() -> Metrics:
+    """Return the configured metrics sink."""
+    return import_string(conf.get_settings().METRICS)()
+
+
+@receiver(setting_changed)
+def reset_metrics(*, setting, **kwargs):
+    if setting == "EMARK":
+        get_metrics.cache_clear()
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:10
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def forwards_func(apps, schema_editor):
+    Send = apps.get_model("emark", "Send")
+    Open = apps.get_model("emark", "Open")
+    Click = apps.get_model("emark", "Click")
+    opens = Open.objects.filter(email=OuterRef("pk")).order_by().values("email")
+    clicks = Click.objects.filter(email=OuterRef("pk")).order_by().values("email")
+    Send.objects.using(schema_editor.connection.alias).update(
+        open_count=Coalesce(
+            Subquery(opens.annotate(count=Count("pk")).values("count")), 0
+        ),
+        first_opened_at=Subquery(
+            opens.annotate(first=Min("created_at")).values("first")
+        ),
+        click_count=Coalesce(
+            Subquery(clicks.annotate(count=Count("pk")).values("count")), 0
+        ),
+        last_clicked_at=Subquery(
+            clicks.annotate(last=Max("created_at")).values("last")
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emark", "0002_rename_from_address_send_from_email_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="send",
+            name="click_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="send",
+            name="first_opened_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="send",
+            name="last_clicked_at",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="send",
+            name="open_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
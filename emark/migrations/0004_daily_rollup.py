@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emark", "0003_send_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="send",
+            name="language",
+            field=models.CharField(blank=True, default="", max_length=35),
+        ),
+        migrations.CreateModel(
+            name="DailyRollup",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("date", models.DateField()),
+                ("campaign", models.CharField(blank=True, max_length=255)),
+                ("language", models.CharField(blank=True, max_length=35)),
+                ("sends", models.PositiveIntegerField(default=0)),
+                ("unique_opens", models.PositiveIntegerField(default=0)),
+                ("unique_clicks", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "campaign", "language"),
+                        name="emark_dailyrollup_unique",
+                    )
+                ],
+            },
+        ),
+    ]
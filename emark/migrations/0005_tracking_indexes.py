@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Coalesce, Left
+
+
+def forwards_func(apps, schema_editor):
+    Send = apps.get_model("emark", "Send")
+    Send.objects.using(schema_editor.connection.alias).update(
+        campaign=Coalesce(Left(KeyTextTransform("utm_campaign", "utm"), 255), Value(""))
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emark", "0004_daily_rollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="send",
+            name="campaign",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="click",
+            index=models.Index(fields=["created_at"], name="emark_click_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="click",
+            index=models.Index(
+                fields=["email", "created_at"], name="emark_click_email_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="open",
+            index=models.Index(fields=["created_at"], name="emark_open_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="open",
+            index=models.Index(
+                fields=["email", "created_at"], name="emark_open_email_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="send",
+            index=models.Index(fields=["created_at"], name="emark_send_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="send",
+            index=models.Index(
+                fields=["user", "created_at"], name="emark_send_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="send",
+            index=models.Index(
+                fields=["campaign", "created_at"], name="emark_send_campaign_idx"
+            ),
+        ),
+        # the foreign key indexes are covered by the composite indexes above
+        migrations.AlterField(
+            model_name="click",
+            name="email",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="emark.send",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="open",
+            name="email",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="emark.send",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="send",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="emark_emails",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
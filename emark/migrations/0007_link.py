@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emark", "0006_user_agent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Link",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("campaign", models.CharField(blank=True, max_length=255)),
+                ("url", models.TextField()),
+                ("digest", models.CharField(editable=False, max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("campaign", "digest"), name="emark_link_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="click",
+            name="link",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.PROTECT, to="emark.link"
+            ),
+        ),
+    ]
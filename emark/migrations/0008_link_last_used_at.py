@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emark", "0007_link"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="link",
+            name="last_used_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+    ]
@@ -1,8 +1,37 @@
+import hashlib
+import random
 import uuid
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import int_to_base36
+
+from emark import conf, tracking
+
+
+class SendQuerySet(models.QuerySet):
+    def reconcile(self):
+        """Recompute the open and click counters from the tracking records."""
+        opens = Open.objects.filter(email=OuterRef("pk")).order_by().values("email")
+        clicks = Click.objects.filter(email=OuterRef("pk")).order_by().values("email")
+        return self.update(
+            open_count=Coalesce(
+                Subquery(opens.annotate(count=Count("pk")).values("count")), 0
+            ),
+            first_opened_at=Subquery(
+                opens.annotate(first=Min("created_at")).values("first")
+            ),
+            click_count=Coalesce(
+                Subquery(clicks.annotate(count=Count("pk")).values("count")), 0
+            ),
+            last_clicked_at=Subquery(
+                clicks.annotate(last=Max("created_at")).values("last")
+            ),
+        )
 
 
 class Send(models.Model):
@@ -17,6 +46,7 @@ class Send(models.Model):
         on_delete=models.SET_NULL,
         related_name="emark_emails",
         null=True,
+        db_index=False,  # covered by the (user, created_at) index
     )
     # In RFC 2822 "from" is a mailbox-list, but Django only support a single
     from_email = models.TextField(max_length=998)
@@ -28,25 +58,174 @@ class Send(models.Model):
     body = models.TextField()
     html = models.TextField(null=True)
     utm = models.JSONField(default=dict)
+    # copy of the utm_campaign parameter, to avoid JSON lookups
+    campaign = models.CharField(max_length=255, blank=True, default="")
+    language = models.CharField(max_length=35, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
+    # denormalized tracking counters, see ClientTrackingModelMixin
+    open_count = models.PositiveIntegerField(default=0, editable=False)
+    click_count = models.PositiveIntegerField(default=0, editable=False)
+    first_opened_at = models.DateTimeField(null=True, editable=False)
+    last_clicked_at = models.DateTimeField(null=True, editable=False)
+
+    objects = SendQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="emark_send_created_idx"),
+            models.Index(
+                fields=["user", "created_at"], name="emark_send_user_created_idx"
+            ),
+            models.Index(
+                fields=["campaign", "created_at"], name="emark_send_campaign_idx"
+            ),
+        ]
 
     def get_absolute_url(self):
         return reverse("emark:email-detail", kwargs={"pk": self.pk})
 
 
+# seconds the short IDs of links are cached for
+LINK_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class LinkQuerySet(models.QuerySet):
+    def get_short_ids(self, campaign: str, urls: list[str]) -> {str: str}:
+        """Return the short IDs of the given URLs, creating links if necessary."""
+        # like the campaign of the emails, long campaign names are truncated
+        campaign = campaign[: Link._meta.get_field("campaign").max_length]
+        cache = tracking.get_cache()
+        keys = {
+            "emark:link:"
+            + hashlib.sha256(f"{campaign}\0{url}".encode()).hexdigest(): url
+            for url in urls
+        }
+        short_ids = {
+            keys[key]: short_id for key, short_id in cache.get_many(keys).items()
+        }
+        if missing := {
+            hashlib.sha256(url.encode()).hexdigest(): url
+            for url in urls
+            if url not in short_ids
+        }:
+            # Existing links are marked as used, which keeps them from being
+            # purged while they are still cached.
+            now = timezone.now()
+            self.bulk_create(
+                [
+                    Link(campaign=campaign, url=url, digest=digest, last_used_at=now)
+                    for digest, url in missing.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["campaign", "digest"],
+                update_fields=["last_used_at"],
+            )
+            created = {
+                link.url: link.short_id
+                for link in self.filter(campaign=campaign, digest__in=missing)
+            }
+            cache.set_many(
+                {key: created[url] for key, url in keys.items() if url in created},
+                timeout=LINK_CACHE_TIMEOUT,
+            )
+            short_ids |= created
+        return short_ids
+
+
+class Link(models.Model):
+    """Distinct redirect URL of a campaign, referenced by short tracking URLs."""
+
+    id = models.BigAutoField(primary_key=True)
+    campaign = models.CharField(max_length=255, blank=True)
+    url = models.TextField()
+    digest = models.CharField(max_length=64, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # last lookup from the database, links might be used from the cache until
+    # LINK_CACHE_TIMEOUT seconds later
+    last_used_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = LinkQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["campaign", "digest"], name="emark_link_unique"
+            )
+        ]
+
+    def __str__(self):
+        return self.url
+
+    @property
+    def short_id(self):
+        return int_to_base36(self.pk)
+
+
+class UserAgentQuerySet(models.QuerySet):
+    def intern(self, value):
+        """Return the primary key of the user agent, creating it if necessary."""
+        digest = hashlib.sha256(value.encode()).hexdigest()
+        cache = tracking.get_cache()
+        key = f"emark:user-agent:{digest}"
+        if pk := cache.get(key):
+            return pk
+        pk = self.get_or_create(digest=digest, defaults={"value": value})[0].pk
+        cache.set(key, pk)
+        return pk
+
+
+class UserAgent(models.Model):
+    """User agent string shared by all tracking records of the same client."""
+
+    id = models.BigAutoField(primary_key=True)
+    digest = models.CharField(max_length=64, unique=True, editable=False)
+    value = models.TextField()
+
+    objects = UserAgentQuerySet.as_manager()
+
+    def __str__(self):
+        return self.value
+
+
 class ClientTrackingQueryset(models.QuerySet):
     def create_for_request(self, request, **kwargs):
-        """Create a tracking record for the given request."""
-        return self.create(
-            headers=dict(request.headers),
-            ip_address=request.META.get("REMOTE_ADDR"),
-            utm={
-                key: value
-                for key, value in request.GET.items()
-                if key.startswith("utm_")
-            },
-            **kwargs,
-        )
+        """Create a tracking record for the given request.
+
+        Only the headers listed in the ``TRACKING_HEADERS`` setting are stored,
+        except for a sample of 1 in ``TRACKING_HEADERS_SAMPLE_RATE`` requests,
+        which store all headers. The user agent is stored separately to avoid
+        storing the same long strings over and over again.
+        """
+        emark_settings = conf.get_settings()
+        capture = {name.lower() for name in emark_settings.TRACKING_HEADERS}
+        sample_rate = emark_settings.TRACKING_HEADERS_SAMPLE_RATE
+        if sample_rate and random.randrange(sample_rate) == 0:  # noqa: S311
+            headers = dict(request.headers)
+        else:
+            headers = {
+                name: value
+                for name, value in request.headers.items()
+                if name.lower() in capture and name.lower() != "user-agent"
+            }
+        user_agent_id = None
+        if "user-agent" in capture and (
+            user_agent := request.headers.get("User-Agent")
+        ):
+            user_agent_id = UserAgent.objects.using(self.db).intern(user_agent)
+        with transaction.atomic(using=self.db):
+            obj = self.create(
+                headers=headers,
+                user_agent_id=user_agent_id,
+                ip_address=request.META.get("REMOTE_ADDR"),
+                utm={
+                    key: value
+                    for key, value in request.GET.items()
+                    if key.startswith("utm_")
+                },
+                **kwargs,
+            )
+            obj.update_email_counters()
+        return obj
 
 
 class ClientTrackingModelMixin(models.Model):
@@ -54,6 +233,9 @@ class ClientTrackingModelMixin(models.Model):
         unique=True, default=uuid.uuid4, editable=False, primary_key=True
     )
     headers = models.JSONField(default=dict)
+    user_agent = models.ForeignKey(
+        UserAgent, on_delete=models.PROTECT, related_name="+", null=True
+    )
     ip_address = models.GenericIPAddressField()
     utm = models.JSONField(default=dict)
 
@@ -66,14 +248,77 @@ class ClientTrackingModelMixin(models.Model):
 class Click(ClientTrackingModelMixin):
     """Record of a click on a link in an email."""
 
-    email = models.ForeignKey(Send, on_delete=models.CASCADE)
+    # indexed by the (email, created_at) index
+    email = models.ForeignKey(Send, on_delete=models.CASCADE, db_index=False)
     # we don't need validation here, but we do need to store long URLs
     redirect_url = models.TextField()
+    link = models.ForeignKey(Link, on_delete=models.PROTECT, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="emark_click_created_idx"),
+            models.Index(
+                fields=["email", "created_at"], name="emark_click_email_created_idx"
+            ),
+        ]
+
+    def update_email_counters(self):
+        Send.objects.filter(pk=self.email_id).update(
+            click_count=F("click_count") + 1,
+            # clicks might be recorded out of order
+            last_clicked_at=Greatest(
+                Coalesce("last_clicked_at", Value(self.created_at)),
+                Value(self.created_at),
+            ),
+        )
+
 
 class Open(ClientTrackingModelMixin):
     """Record of an email being opened."""
 
-    email = models.ForeignKey(Send, on_delete=models.CASCADE)
+    # indexed by the (email, created_at) index
+    email = models.ForeignKey(Send, on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="emark_open_created_idx"),
+            models.Index(
+                fields=["email", "created_at"], name="emark_open_email_created_idx"
+            ),
+        ]
+
+    def update_email_counters(self):
+        Send.objects.filter(pk=self.email_id).update(
+            open_count=F("open_count") + 1,
+            # opens might be recorded out of order
+            first_opened_at=Least(
+                Coalesce("first_opened_at", Value(self.created_at)),
+                Value(self.created_at),
+            ),
+        )
+
+
+class DailyRollup(models.Model):
+    """Daily number of sent, opened and clicked emails per campaign and language.
+
+    Opens and clicks are counted once per email on the day they occurred.
+    The rows are maintained by the ``emark_rollup`` management command.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    date = models.DateField()
+    campaign = models.CharField(max_length=255, blank=True)
+    language = models.CharField(max_length=35, blank=True)
+    sends = models.PositiveIntegerField(default=0)
+    unique_opens = models.PositiveIntegerField(default=0)
+    unique_clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "campaign", "language"],
+                name="emark_dailyrollup_unique",
+            )
+        ]
@@ -0,0 +1,134 @@
+"""Sampling profiler for rendering emails.
+
+A sample of renders is run under :mod:`cProfile`, if the ``PROFILE_SAMPLE_RATE``
+setting is set. The stats are aggregated per email class in the memory of the
+current process and can be exported in the binary pstats format or as collapsed
+stacks, which are understood by flame graph tools.
+"""
+
+import collections
+import contextlib
+import cProfile
+import marshal
+import pstats
+import random
+import threading
+
+from emark import conf
+
+__all__ = [
+    "get_samples",
+    "get_stats",
+    "profile",
+    "reset_stats",
+    "to_collapsed",
+    "to_pstats",
+]
+
+_lock = threading.Lock()
+_stats: dict[str, pstats.Stats] = {}
+_samples: collections.Counter = collections.Counter()
+
+# Call paths below this cumulative time (in seconds) are omitted
+# from collapsed stacks, to keep the output of deep call graphs small.
+MIN_COLLAPSED_TIME = 1e-6
+
+
+def get_key(email_class) -> str:
+    return f"{email_class.__module__}.{email_class.__qualname__}"
+
+
+@contextlib.contextmanager
+def profile(email_class):
+    """Run 1 in N calls of the block under cProfile and keep the stats."""
+    sample_rate = conf.get_settings().PROFILE_SAMPLE_RATE
+    if not sample_rate or random.randrange(sample_rate) != 0:  # noqa: S311
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Only one profiler can be active at a time, e.g. in another thread.
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        key = get_key(email_class)
+        with _lock:
+            if key in _stats:
+                _stats[key].add(profiler)
+            else:
+                _stats[key] = pstats.Stats(profiler)
+            _samples[key] += 1
+
+
+def get_stats(key: str = None) -> pstats.Stats | None:
+    """Return the aggregated stats of an email class or of all email classes."""
+    with _lock:
+        selected = [
+            stats for name, stats in _stats.items() if key is None or name == key
+        ]
+        if not selected:
+            return None
+        stats = pstats.Stats()
+        stats.add(*selected)
+    return stats
+
+
+def get_samples() -> dict[str, int]:
+    """Return the number of profiled renders per email class."""
+    with _lock:
+        return dict(_samples)
+
+
+def reset_stats():
+    """Discard all collected stats."""
+    with _lock:
+        _stats.clear()
+        _samples.clear()
+
+
+def to_pstats(stats: pstats.Stats) -> bytes:
+    """Return the stats in the format of :meth:`pstats.Stats.dump_stats`."""
+    return marshal.dumps(stats.stats)
+
+
+def to_collapsed(stats: pstats.Stats) -> str:
+    """Return the stats as collapsed stacks with the time in microseconds.
+
+    cProfile only records callers and callees, not full stacks. The time of
+    a function is split between its call paths in proportion to the time
+    spent in each caller.
+    """
+    callees = collections.defaultdict(dict)
+    for func, (*_, callers) in stats.stats.items():
+        for caller, (*_, cumulative) in callers.items():
+            callees[caller][func] = cumulative
+    stacks = collections.Counter()
+
+    def walk(func, stack, ratio):
+        _, _, total, cumulative, _ = stats.stats[func]
+        stack = [*stack, func]
+        stacks[";".join(map(format_func, stack))] += total * ratio
+        for callee, edge in callees[func].items():
+            callee_cumulative = stats.stats[callee][3]
+            share = ratio * edge
+            if callee in stack or share < MIN_COLLAPSED_TIME or not callee_cumulative:
+                continue
+            walk(callee, stack, share / callee_cumulative)
+
+    for func, (*_, callers) in stats.stats.items():
+        if not callers:
+            walk(func, [], 1)
+    return "".join(
+        f"{stack} {round(seconds * 1e6)}\n"
+        for stack, seconds in sorted(stacks.items())
+        if round(seconds * 1e6)
+    )
+
+
+def format_func(func) -> str:
+    return pstats.func_std_string(func).replace(";", ":")
@@ -0,0 +1,19 @@
+"""Signals sent while rendering and sending emails.
+
+Receivers get monotonic durations in seconds, which allows attributing slow
+sends to a specific stage and template, e.g. in an APM. Stages are only
+measured while at least one receiver is connected.
+"""
+
+from django.dispatch import Signal
+
+__all__ = ["messages_sent", "stage_rendered"]
+
+# Sent after each render stage of a message, with the email class as sender.
+# Arguments: message, stage, duration, size (bytes of the output), language
+# Stages: template, utm, markdown, layout, inline, minify (optional), text
+stage_rendered = Signal()
+
+# Sent after a backend has sent a batch of messages, with the backend class
+# as sender. Arguments: backend, messages, sent, duration
+messages_sent = Signal()
@@ -0,0 +1,121 @@
+"""SMTP connections that pipeline the commands of a mail transaction (RFC 2920)."""
+
+import re
+import smtplib
+
+__all__ = ["PipeliningSMTP", "PipeliningSMTPSSL"]
+
+LINE_BREAK_RE = re.compile(r"\r\n|\n|\r")
+LEADING_PERIOD_RE = re.compile(rb"(?m)^\.")
+
+
+def format_command(command, argument, options):
+    return " ".join([command, argument, *options]) + "\r\n"
+
+
+class PipeliningMixin:
+    """Send MAIL, all RCPT and the DATA command in a single round trip.
+
+    Pipelining is used if the server advertises the PIPELINING extension.
+    Otherwise, the commands are sent one by one. Errors are mapped to senders
+    and recipients like they are by :meth:`smtplib.SMTP.sendmail`.
+    """
+
+    # size in bytes of the last message passed to sendmail
+    message_size = None
+
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):
+        if isinstance(msg, str):
+            msg = LINE_BREAK_RE.sub("\r\n", msg).encode("ascii")
+        self.message_size = len(msg)
+        self.ehlo_or_helo_if_needed()
+        if not self.has_extn("pipelining") or any(
+            option.lower() == "smtputf8" for option in mail_options
+        ):
+            return super().sendmail(
+                from_addr, to_addrs, msg, mail_options, rcpt_options
+            )
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        mail_options = list(mail_options)
+        if self.has_extn("size"):
+            mail_options.insert(0, f"size={len(msg)}")
+        self.send(
+            "".join(
+                [
+                    format_command(
+                        "mail", f"FROM:{smtplib.quoteaddr(from_addr)}", mail_options
+                    ),
+                    *(
+                        format_command(
+                            "rcpt", f"TO:{smtplib.quoteaddr(addr)}", rcpt_options
+                        )
+                        for addr in to_addrs
+                    ),
+                    "data\r\n",
+                ]
+            )
+        )
+        replies = self.get_replies(len(to_addrs) + 2)
+
+        code, resp = replies[0]
+        if code != 250:
+            self.abort(replies)
+            raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+        senderrs = {
+            addr: reply
+            for addr, reply in zip(to_addrs, replies[1:], strict=False)
+            if reply[0] not in (250, 251)
+        }
+        if len(senderrs) == len(to_addrs) or any(
+            code == 421 for code, _ in senderrs.values()
+        ):
+            self.abort(replies)
+            raise smtplib.SMTPRecipientsRefused(senderrs)
+        code, resp = replies[-1]
+        if code != 354:
+            self.abort(replies)
+            raise smtplib.SMTPDataError(code, resp)
+
+        code, resp = self.send_data(msg)
+        if code != 250:
+            self.abort([(code, resp)])
+            raise smtplib.SMTPDataError(code, resp)
+        return senderrs
+
+    def get_replies(self, count):
+        """Return the replies to pipelined commands, until the server closes."""
+        replies = []
+        for _ in range(count):
+            replies.append(self.getreply())
+            if replies[-1][0] == 421:
+                break
+        return replies
+
+    def send_data(self, msg):
+        """Send the message after the server accepted the DATA command."""
+        data = LEADING_PERIOD_RE.sub(b"..", msg)
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        self.send(data + b".\r\n")
+        return self.getreply()
+
+    def abort(self, replies):
+        """Reset the transaction, or close the connection if the server did."""
+        code, _ = replies[-1]
+        if code == 421:
+            self.close()
+            return
+        if code == 354:
+            # the server accepted DATA, but the transaction already failed
+            self.send(b".\r\n")
+            self.getreply()
+        self._rset()
+
+
+class PipeliningSMTP(PipeliningMixin, smtplib.SMTP):
+    """SMTP connection with command pipelining."""
+
+
+class PipeliningSMTPSSL(PipeliningMixin, smtplib.SMTP_SSL):
+    """SMTP connection over SSL with command pipelining."""
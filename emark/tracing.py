@@ -0,0 +1,39 @@
+"""Optional OpenTelemetry spans, if the ``opentelemetry-api`` package is installed."""
+
+import contextlib
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover
+    trace = None
+
+__all__ = ["start_span"]
+
+
+class NoOpSpan:
+    """Stand-in for a span, if OpenTelemetry is not installed."""
+
+    def is_recording(self) -> bool:
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP_SPAN = NoOpSpan()
+
+
+def start_span(name: str, attributes: dict = None):
+    """Return a context manager, that starts a span as the current span.
+
+    Attributes with a value of ``None`` are omitted. Without OpenTelemetry,
+    the context manager yields a span that does nothing.
+    """
+    if trace is None:
+        return contextlib.nullcontext(NOOP_SPAN)
+    return trace.get_tracer("emark").start_as_current_span(
+        name,
+        attributes={
+            key: value for key, value in (attributes or {}).items() if value is not None
+        },
+    )
@@ -0,0 +1,172 @@
+"""Helpers to reduce the write volume of open and click tracking."""
+
+import functools
+import hashlib
+import ipaddress
+import logging
+import re
+
+from django.core import signing
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+
+from emark import conf
+from emark.metrics import get_metrics
+
+__all__ = [
+    "IPPrefixFilter",
+    "UserAgentFilter",
+    "get_counter",
+    "incr_counter",
+    "is_duplicate",
+    "is_filtered",
+    "sign_link",
+    "sign_url",
+    "unsign_link",
+    "verify_url",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache():
+    """Return the cache used to store tracking state."""
+    return caches[conf.get_settings().TRACKING_CACHE]
+
+
+def incr_counter(name: str, delta: int = 1) -> None:
+    """Increment a tracking counter, e.g. the number of suppressed events."""
+    cache = get_cache()
+    key = f"emark:counter:{name}"
+    if not cache.add(key, delta, timeout=None):
+        cache.incr(key, delta)
+
+
+def get_counter(name: str) -> int:
+    """Return the current value of a tracking counter."""
+    return get_cache().get(f"emark:counter:{name}", 0)
+
+
+def is_duplicate(request, event: str, email_pk, *extra) -> bool:
+    """Return whether the event has already been tracked within the window.
+
+    Events are keyed by the email, the event type, the client's IP address and
+    user agent, and any extra values, like the redirect URL of a click.
+    Mail clients and image proxies often request the same resource multiple
+    times for a single open, which would otherwise all be stored.
+    """
+    window = conf.get_settings().TRACKING_DEDUPLICATION_WINDOW
+    if not window:
+        return False
+    fingerprint = hashlib.sha256(
+        "\0".join(
+            [
+                request.META.get("REMOTE_ADDR") or "",
+                request.headers.get("User-Agent", ""),
+                *map(str, extra),
+            ]
+        ).encode()
+    ).hexdigest()
+    key = f"emark:{event}:{email_pk}:{fingerprint}"
+    if get_cache().add(key, True, timeout=window):
+        return False
+    incr_counter(f"{event}:suppressed")
+    get_metrics().incr("tracking_events", event=event, status="duplicate")
+    return True
+
+
+class UserAgentFilter:
+    """Filter requests whose user agent matches any of the given patterns."""
+
+    def __init__(self, patterns: list[str]):
+        self.pattern = re.compile(
+            "|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE
+        )
+
+    def __call__(self, request) -> bool:
+        return bool(self.pattern.search(request.headers.get("User-Agent", "")))
+
+
+class IPPrefixFilter:
+    """Filter requests from any of the given networks, e.g. ``10.0.0.0/8``."""
+
+    def __init__(self, prefixes: list[str]):
+        self.networks = [
+            ipaddress.ip_network(prefix, strict=False) for prefix in prefixes
+        ]
+
+    def __call__(self, request) -> bool:
+        try:
+            address = ipaddress.ip_address(request.META.get("REMOTE_ADDR"))
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+
+@functools.cache
+def get_filters():
+    """Return the configured chain of tracking filters."""
+    emark_settings = conf.get_settings()
+    filters = []
+    if emark_settings.TRACKING_IGNORED_USER_AGENTS:
+        filters.append(UserAgentFilter(emark_settings.TRACKING_IGNORED_USER_AGENTS))
+    if emark_settings.TRACKING_IGNORED_IP_PREFIXES:
+        filters.append(IPPrefixFilter(emark_settings.TRACKING_IGNORED_IP_PREFIXES))
+    filters += [import_string(path) for path in emark_settings.TRACKING_FILTERS]
+    return filters
+
+
+@receiver(setting_changed)
+def reset_filters(*, setting, **kwargs):
+    if setting == "EMARK":
+        get_filters.cache_clear()
+
+
+def is_filtered(request, event: str) -> bool:
+    """Return whether the request should not be tracked.
+
+    Security scanners and mail privacy proxies fetch every link and pixel.
+    Filters are evaluated before any database access. Filtered events are
+    either dropped or counted, depending on the ``TRACKING_FILTER_ACTION``.
+    """
+    for tracking_filter in get_filters():
+        if tracking_filter(request):
+            logger.debug(
+                "Filtered %s event by %r",
+                event,
+                tracking_filter,
+                extra={"request": request},
+            )
+            if conf.get_settings().TRACKING_FILTER_ACTION == "count":
+                incr_counter(f"{event}:filtered")
+            get_metrics().incr("tracking_events", event=event, status="filtered")
+            return True
+    return False
+
+
+def sign_url(email_pk, url: str) -> str:
+    """Return the signature of a redirect URL of a tracked email."""
+    return signing.Signer(salt="emark.tracking").signature(f"{email_pk}:{url}")
+
+
+def verify_url(email_pk, url: str, signature: str) -> bool:
+    """Return whether the signature matches the redirect URL of a tracked email."""
+    return constant_time_compare(signature, sign_url(email_pk, url))
+
+
+def sign_link(email_pk, short_id: str) -> str:
+    """Return the token of a short link, that is only valid for a tracked email."""
+    signature = signing.Signer(salt="emark.link").signature(f"{email_pk}:{short_id}")
+    # 96 bits of the signature keep the tracking URL short
+    return f"{short_id}-{signature[:16]}"
+
+
+def unsign_link(email_pk, token: str) -> str:
+    """Return the short ID of a link token, if it is valid for the tracked email."""
+    short_id, _, _ = token.partition("-")
+    if not constant_time_compare(token, sign_link(email_pk, short_id)):
+        raise signing.BadSignature(f"Link token {token!r} does not match the email.")
+    return short_id
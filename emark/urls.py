@@ -7,4 +7,9 @@ urlpatterns = [
     path("<uuid:pk>/", views.EmailDetailView.as_view(), name="email-detail"),
     path("<uuid:pk>/click", views.EmailClickView.as_view(), name="email-click"),
     path("<uuid:pk>/open", views.EmailOpenView.as_view(), name="email-open"),
+    path(
+        "<uuid:pk>/c/<str:link>",
+        views.EmailLinkClickView.as_view(),
+        name="email-link",
+    ),
 ]
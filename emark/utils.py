@@ -4,7 +4,20 @@ import dataclasses
 import re
 from html.parser import HTMLParser
 
-__all__ = ["HTML2TextParser"]
+__all__ = ["HTML2TextParser", "minify_html", "wrap_lines"]
+
+# RFC 5322 line length limit in bytes, longer lines require
+# the quoted-printable or base64 transfer encoding
+MAX_LINE_LENGTH = 998
+
+# comments, except for conditional comments, like <!--[if mso]>
+COMMENT_RE = re.compile(r"<!--(?!\[if)(?!<!).*?-->", re.DOTALL)
+PRESERVE_RE = re.compile(r"(<pre\b.*?</pre>|<textarea\b.*?</textarea>)", re.DOTALL)
+STYLE_RE = re.compile(r"(<style\b[^>]*>)(.*?)(</style>)", re.DOTALL | re.IGNORECASE)
+CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+CSS_SPACE_RE = re.compile(r"\s*([{};,])\s*")
+LINE_BREAK_RE = re.compile(r"[ \t]*\n\s*")
+SPACES_RE = re.compile(r"[ \t]{2,}")
 
 
 @dataclasses.dataclass
@@ -122,3 +135,79 @@ class HTML2TextParser(HTMLParser):
         # sanitize all wide vertical or horizontal spaces
         text = self.DOUBLE_NEWLINE.sub("\n\n", text.strip())
         return self.DOUBLE_SPACE.sub(" ", text)
+
+
+def minify_css(match: re.Match) -> str:
+    css = CSS_COMMENT_RE.sub("", match.group(2))
+    css = CSS_SPACE_RE.sub(r"\1", " ".join(css.split()))
+    return f"{match.group(1)}{css}{match.group(3)}"
+
+
+def minify_html(html: str) -> str:
+    """Remove comments, indentation and redundant whitespace from HTML.
+
+    Line breaks and single spaces are kept, since they might be significant
+    between inline elements. Conditional comments for Outlook as well as
+    preformatted text are left untouched.
+    """
+    segments = PRESERVE_RE.split(html)
+    for i, segment in enumerate(segments):
+        if i % 2:
+            continue  # preformatted text
+        segment = COMMENT_RE.sub("", segment)
+        segment = STYLE_RE.sub(minify_css, segment)
+        segment = LINE_BREAK_RE.sub("\n", segment)
+        segments[i] = SPACES_RE.sub(" ", segment)
+    return "".join(segments).strip()
+
+
+def wrap_lines(html: str, limit: int = MAX_LINE_LENGTH) -> str:
+    """Break lines of HTML that are longer than the limit in bytes.
+
+    Lines are broken at spaces in text or between attributes. Keeping all
+    lines within the limit of RFC 5322 allows sending the HTML 8bit encoded,
+    which is smaller than quoted-printable or base64. Preformatted text is
+    left untouched.
+    """
+    segments = PRESERVE_RE.split(html)
+    for i, segment in enumerate(segments):
+        if i % 2:
+            continue  # preformatted text
+        segments[i] = "\n".join(wrap_line(line, limit) for line in segment.split("\n"))
+    return "".join(segments)
+
+
+def is_break(line: str, pos: int) -> bool:
+    """Return whether the space is outside of tags or between attributes."""
+    return line[pos - 1] == '"' or line.rfind("<", 0, pos) <= line.rfind(">", 0, pos)
+
+
+def find_break(line: str, start: int, end: int) -> int:
+    """Return the last safe space before the end, or else the first one after it."""
+    pos = end + 1
+    while (pos := line.rfind(" ", start + 1, pos)) != -1:
+        if is_break(line, pos):
+            return pos
+    # no safe position within the limit, like in a long URL
+    pos = end
+    while (pos := line.find(" ", pos + 1)) != -1:
+        if is_break(line, pos):
+            return pos
+    return -1
+
+
+def wrap_line(line: str, limit: int) -> str:
+    remaining = len(line.encode())
+    lines = []
+    start = 0
+    while remaining > limit:
+        # the longest prefix that fits into the limit in bytes
+        window = line[start : start + limit].encode()[:limit].decode(errors="ignore")
+        end = find_break(line, start, start + len(window))
+        if end == -1:
+            break
+        lines.append(line[start:end])
+        remaining -= len(line[start : end + 1].encode())
+        start = end + 1
+    lines.append(line[start:])
+    return "\n".join(lines)
@@ -1,13 +1,18 @@
+import functools
 import logging
 from urllib.parse import urlparse
 
 from django import http
 from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError
 from django.http.request import split_domain_port, validate_host
+from django.utils.http import base36_to_int
 from django.views import View
 from django.views.generic.detail import SingleObjectMixin
 
-from . import models
+from . import models, tracing, tracking
+from .metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +28,46 @@ logger = logging.getLogger(__name__)
 TRACKING_PIXEL_GIF = b"GIF87a\x01\x00\x01\x00\x81\x00\x00\xff\xff\xff\x00\x00\x00\x00\x00\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x08\x04\x00\x01\x04\x04\x00;"
 
 
+@functools.lru_cache(maxsize=4096)
+def get_link_url(short_id: str) -> str:
+    """Return the URL of a link, links are immutable and can be cached."""
+    try:
+        pk = base36_to_int(short_id)
+    except ValueError as e:
+        raise models.Link.DoesNotExist from e
+    return models.Link.objects.values_list("url", flat=True).get(pk=pk)
+
+
+class DeferredHttpResponseRedirect(http.HttpResponseRedirect):
+    """Redirect that runs callbacks once the response has been sent."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.callbacks = []
+
+    def close(self):
+        # Run the callbacks before the request_finished signal is sent,
+        # which closes the database connection.
+        for callback in self.callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Deferred callback failed")
+        super().close()
+
+
+class SpanMixin:
+    """Handle the request within a span, named after the tracked event."""
+
+    span_name = None
+
+    def dispatch(self, request, *args, **kwargs):
+        with tracing.start_span(
+            self.span_name, {"emark.email_id": str(kwargs.get("pk"))}
+        ):
+            return super().dispatch(request, *args, **kwargs)
+
+
 class EmailDetailView(SingleObjectMixin, View):
     """Return the HTML body of the email."""
 
@@ -39,13 +84,33 @@ class EmailDetailView(SingleObjectMixin, View):
         )
 
 
-class EmailClickView(SingleObjectMixin, View):
+class EmailClickView(SpanMixin, SingleObjectMixin, View):
     """Redirect to the URL and track the click."""
 
     model = models.Send
+    span_name = "emark.click"
 
     def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
+        # Filtered requests are redirected without any database access.
+        filtered = tracking.is_filtered(request, "click")
+        redirect_to = request.GET.get("url")
+        signature = request.GET.get("sig")
+        if (
+            redirect_to is not None
+            and signature is not None
+            and tracking.verify_url(kwargs["pk"], redirect_to, signature)
+        ):
+            # Signed URLs are safe to redirect to and the click is tracked
+            # after the response has been sent to the client.
+            response = DeferredHttpResponseRedirect(redirect_to)
+            if not filtered:
+                response.callbacks.append(
+                    lambda: self.track_click(request, kwargs["pk"], redirect_to)
+                )
+            return response
+
+        if not filtered:
+            self.object = self.get_object()
 
         try:
             redirect_to = request.GET["url"]
@@ -81,21 +146,74 @@ class EmailClickView(SingleObjectMixin, View):
                 )
                 return http.HttpResponseBadRequest("Malformed url parameter")
 
-        models.Click.objects.create_for_request(
-            request, email=self.object, redirect_url=redirect_to
-        )
+        if not filtered:
+            self.track_click(request, self.object.pk, redirect_to)
         return http.HttpResponseRedirect(redirect_to)
 
+    def track_click(self, request, email_pk, redirect_to, **kwargs):
+        if tracking.is_duplicate(request, "click", email_pk, redirect_to):
+            return
+        metrics = get_metrics()
+        try:
+            with (
+                tracing.start_span("emark.click.insert"),
+                metrics.timer("tracking_insert_duration_seconds", event="click"),
+            ):
+                models.Click.objects.create_for_request(
+                    request, email_id=email_pk, redirect_url=redirect_to, **kwargs
+                )
+        except IntegrityError:
+            logger.warning(
+                "Click on unknown email: %s",
+                email_pk,
+                extra={"request": request},
+            )
+            metrics.incr("tracking_events", event="click", status="unknown")
+        else:
+            metrics.incr("tracking_events", event="click", status="tracked")
+
+
+class EmailLinkClickView(EmailClickView):
+    """Redirect to a short link and track the click."""
 
-class EmailOpenView(SingleObjectMixin, View):
+    def get(self, request, *args, **kwargs):
+        try:
+            # The token binds the link to the email, which keeps the
+            # sequential short IDs from being enumerated.
+            short_id = tracking.unsign_link(kwargs["pk"], kwargs["link"])
+            redirect_to = get_link_url(short_id)
+        except (signing.BadSignature, models.Link.DoesNotExist) as e:
+            raise http.Http404() from e
+        # Links are safe to redirect to and the click is tracked
+        # after the response has been sent to the client.
+        response = DeferredHttpResponseRedirect(redirect_to)
+        if not tracking.is_filtered(request, "click"):
+            response.callbacks.append(
+                lambda: self.track_click(
+                    request,
+                    kwargs["pk"],
+                    redirect_to,
+                    link_id=base36_to_int(short_id),
+                )
+            )
+        return response
+
+
+class EmailOpenView(SpanMixin, SingleObjectMixin, View):
     """Return a tracking pixel and track the open."""
 
     model = models.Send
+    span_name = "emark.open"
 
     def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-
-        models.Open.objects.create_for_request(request, email=self.object)
+        # Filtered requests receive the pixel without any database access.
+        if not tracking.is_filtered(request, "open"):
+            self.object = self.get_object()
+            if not tracking.is_duplicate(request, "open", self.object.pk):
+                metrics = get_metrics()
+                with metrics.timer("tracking_insert_duration_seconds", event="open"):
+                    models.Open.objects.create_for_request(request, email=self.object)
+                metrics.incr("tracking_events", event="open", status="tracked")
 
         return http.HttpResponse(
             TRACKING_PIXEL_GIF,
@@ -0,0 +1,64 @@
+"""Prepare a fresh worker to send emails without first-request latency spikes.
+
+The first email a worker sends pays for compiling templates, parsing the CSS
+with premailer and cssutils, and loading the translation catalogs.
+"""
+
+import logging
+
+import markdown
+from django.apps import apps
+from django.conf import settings
+from django.utils import translation
+
+from emark.message import MARKDOWN_EXTENSIONS, MarkdownEmail, inline_css
+
+__all__ = ["warmup"]
+
+logger = logging.getLogger(__name__)
+
+
+def get_email_classes() -> list[type[MarkdownEmail]]:
+    """Return the email classes registered with the dashboard."""
+    if not apps.is_installed("emark.contrib.dashboard"):
+        return []
+    from emark.contrib.dashboard import _registry
+
+    return list(_registry.values())
+
+
+def warmup(email_classes=None, languages=None) -> tuple[int, int]:
+    """Precompile templates and load translation catalogs.
+
+    Returns:
+        The number of warmed up email classes and languages.
+
+    """
+    if email_classes is None:
+        email_classes = get_email_classes()
+    if languages is None:
+        languages = [code for code, _name in settings.LANGUAGES]
+    if not settings.USE_I18N:
+        languages = []
+
+    for language in languages:
+        # activating a language loads its translation catalogs
+        with translation.override(language):
+            translation.gettext("")
+
+    count = 0
+    for email_class in email_classes:
+        spec = email_class.get_spec()
+        try:
+            spec.template  # noqa: B018
+            inline_css(spec.base_template.render({}))
+            spec.utm_params  # noqa: B018
+            spec.get_tracking_paths()
+        except Exception:
+            logger.warning("Failed to warm up %s", email_class, exc_info=True)
+        else:
+            count += 1
+
+    # The first call of markdown loads its extensions.
+    markdown.markdown("", extensions=MARKDOWN_EXTENSIONS)
+    return count, len(languages)
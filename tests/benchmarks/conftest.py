@@ -0,0 +1,66 @@
+import pytest
+from emark.message import MarkdownEmail
+
+pytest.importorskip("pytest_benchmark")
+
+# number of sections, each with a paragraph, a markdown and an HTML link
+SIZES = {"small": 5, "medium": 25, "large": 100}
+# peak memory of rendering an email in bytes, about 1.5 times the baseline
+PEAK_MEMORY = {"small": 320 * 1024, "medium": 960 * 1024, "large": 3200 * 1024}
+
+
+def get_markdown_template(sections):
+    """Return a synthetic markdown template with the given number of sections."""
+    return "\n\n".join(
+        [
+            "# Hello {{ donut_name }}",
+            *(
+                f"## Section {i}\n\n"
+                "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do"
+                " eiusmod tempor incididunt ut labore et dolore magna aliqua."
+                f" Read [more about {{{{ donut_type }}}}](https://www.example.com/articles/{i}/)"
+                f' or <a href="https://www.example.com/articles/{i}/?ref=html">here</a>.'
+                "\n\n| Item | Value |\n| --- | --- |\n"
+                f"| Donut | {{{{ donut_name }}}} |\n| Number | {i} |"
+                for i in range(sections)
+            ),
+            "Best regards,  \nThe Donut Shop",
+        ]
+    )
+
+
+class BenchmarkEmail(MarkdownEmail):
+    subject = "Benchmark for %(donut_name)s"
+    template = "benchmark.md"
+
+
+@pytest.fixture(params=SIZES, ids=SIZES)
+def size(request, settings):
+    settings.TEMPLATES = [
+        {
+            "BACKEND": "django.template.backends.django.DjangoTemplates",
+            "OPTIONS": {
+                "loaders": [
+                    (
+                        "django.template.loaders.locmem.Loader",
+                        {"benchmark.md": get_markdown_template(SIZES[request.param])},
+                    ),
+                    "django.template.loaders.app_directories.Loader",
+                ],
+            },
+        }
+    ]
+    return request.param
+
+
+@pytest.fixture
+def make_email(size):
+    def _make_email(**kwargs):
+        return BenchmarkEmail(
+            language="en-US",
+            context={"donut_name": "Nutty Donut", "donut_type": "Frosted"},
+            to=["test@example.com"],
+            **kwargs,
+        )
+
+    return _make_email
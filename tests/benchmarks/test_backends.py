@@ -0,0 +1,54 @@
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from emark import backends
+
+pytest.importorskip("pytest_benchmark")
+
+pytestmark = pytest.mark.benchmark
+
+# number of messages sent per round
+BATCH_SIZE = 10
+ROUNDS = 3
+
+
+@pytest.fixture
+def send_messages(benchmark, make_email):
+    """Benchmark sending a batch of freshly created messages per round."""
+
+    def setup():
+        return ([make_email() for _ in range(BATCH_SIZE)],), {}
+
+    def _send_messages(backend):
+        def send(messages):
+            # --benchmark-disable runs each benchmark only once
+            _send_messages.calls += 1
+            return backend.send_messages(messages)
+
+        benchmark.extra_info["messages"] = BATCH_SIZE
+        return benchmark.pedantic(send, setup=setup, rounds=ROUNDS)
+
+    _send_messages.calls = 0
+    return _send_messages
+
+
+@pytest.mark.parametrize("size", ["medium"], indirect=True)
+class TestSendMessages:
+    def test_locmem(self, send_messages):
+        assert send_messages(LocmemEmailBackend()) == BATCH_SIZE
+        assert mail.outbox
+
+    def test_smtp(self, send_messages, smtp_server):
+        backend = backends.SMTPEmailBackend(
+            host=smtp_server.host, port=smtp_server.port
+        )
+        assert send_messages(backend) == BATCH_SIZE
+        assert len(smtp_server.messages) == send_messages.calls * BATCH_SIZE
+
+    @pytest.mark.django_db
+    def test_tracking_smtp(self, send_messages, smtp_server):
+        backend = backends.TrackingSMTPEmailBackend(
+            host=smtp_server.host, port=smtp_server.port
+        )
+        assert send_messages(backend) == BATCH_SIZE
+        assert len(smtp_server.messages) == send_messages.calls * BATCH_SIZE
@@ -0,0 +1,96 @@
+import tracemalloc
+import uuid
+
+import markdown
+import pytest
+from django.utils import translation
+from django.utils.safestring import mark_safe
+from emark.message import MARKDOWN_EXTENSIONS, inline_css
+
+from tests.benchmarks.conftest import PEAK_MEMORY
+
+pytest.importorskip("pytest_benchmark")
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.fixture
+def stages(make_email):
+    """Return the email and the inputs of each render stage."""
+    msg = make_email()
+    msg.uuid = uuid.uuid4()
+    spec = msg.get_spec()
+    with translation.override(msg.language):
+        utm = msg.get_utm_params()
+        context = msg.get_context_data() | utm
+        template_markdown = spec.template.render(context)
+        markdown_string = msg.inject_utm_params(template_markdown, **utm)
+        html_message = markdown.markdown(
+            markdown_string, extensions=MARKDOWN_EXTENSIONS
+        )
+        html = spec.base_template.render(
+            context | {"markdown_string": mark_safe(html_message)}  # noqa: S308
+        )
+        inlined_html = inline_css(html)
+    return {
+        "msg": msg,
+        "context": context,
+        "utm": utm,
+        "template_markdown": template_markdown,
+        "markdown_string": markdown_string,
+        "html": html,
+        "inlined_html": inlined_html,
+    }
+
+
+class TestRenderStages:
+    def test_template(self, benchmark, stages):
+        template = stages["msg"].get_spec().template
+        assert benchmark(template.render, stages["context"])
+
+    def test_utm(self, benchmark, stages):
+        msg = stages["msg"]
+        result = benchmark(
+            msg.inject_utm_params, stages["template_markdown"], **stages["utm"]
+        )
+        assert "utm_campaign%3DBENCHMARK_EMAIL" in result
+
+    def test_markdown(self, benchmark, stages):
+        result = benchmark(
+            markdown.markdown,
+            stages["markdown_string"],
+            extensions=MARKDOWN_EXTENSIONS,
+        )
+        assert "<table>" in result
+
+    def test_inline(self, benchmark, stages):
+        assert benchmark(inline_css, stages["html"])
+
+    def test_text(self, benchmark, stages):
+        result = benchmark(stages["msg"].get_body, stages["inlined_html"])
+        assert "Nutty Donut" in result
+
+
+class TestRender:
+    def test_render(self, benchmark, make_email, size):
+        def setup():
+            return (make_email(),), {"tracking_uuid": uuid.uuid4()}
+
+        def render(msg, tracking_uuid):
+            msg.render(tracking_uuid=tracking_uuid)
+            return msg
+
+        msg = benchmark.pedantic(render, setup=setup, rounds=5)
+        assert msg.html
+
+        tracemalloc.start()
+        try:
+            make_email().render(tracking_uuid=uuid.uuid4())
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_memory"] = peak
+        assert peak <= PEAK_MEMORY[size], (
+            f"Rendering a {size} email peaked at {peak} bytes,"
+            f" which exceeds the budget of {PEAK_MEMORY[size]} bytes."
+        )
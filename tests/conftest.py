@@ -1,8 +1,21 @@
+import socketserver
+import threading
+import time
+
 import pytest
+from django.core.cache import cache
+from emark import views
 
 from tests.test_message import MarkdownEmailTest
 
 
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    yield
+    cache.clear()
+    views.get_link_url.cache_clear()
+
+
 @pytest.fixture
 def email_message():
     msg = MarkdownEmailTest(
@@ -12,3 +25,106 @@ def email_message():
         to=["test@example.com"],
     )
     return msg
+
+
+class SMTPHandler(socketserver.BaseRequestHandler):
+    """Answer SMTP commands like a permissive mail server would."""
+
+    def handle(self):
+        self.envelope = {}
+        self.data = None
+        self.request.sendall(b"220 localhost ESMTP stand-in\r\n")
+        buffer = b""
+        while chunk := self.request.recv(65536):
+            buffer += chunk
+            replies = []
+            while b"\r\n" in buffer:
+                line, buffer = buffer.split(b"\r\n", 1)
+                if self.data is None:
+                    reply = self.handle_line(line)
+                else:
+                    reply = self.handle_data(line)
+                if reply:
+                    replies.append(reply)
+                if reply and reply.startswith(b"221"):
+                    self.reply(replies)
+                    return
+            # all replies to the commands received at once are sent at once,
+            # after a single delay, like a server with network latency
+            if replies:
+                self.reply(replies)
+
+    def reply(self, replies):
+        time.sleep(self.server.latency)
+        self.request.sendall(b"".join(reply + b"\r\n" for reply in replies))
+
+    def handle_data(self, line):
+        if line == b".":
+            self.server.messages.append({**self.envelope, "data": self.data})
+            self.envelope, self.data = {}, None
+            return b"250 OK"
+        self.data += line[1:] if line.startswith(b"..") else line
+        self.data += b"\r\n"
+        return None
+
+    def handle_line(self, line):
+        command, _, argument = line.decode().partition(" ")
+        match command.upper():
+            case "EHLO":
+                return b"\r\n".join(
+                    [
+                        b"250-localhost",
+                        *(f"250-{ext}".encode() for ext in self.server.extensions),
+                        b"250 HELP",
+                    ]
+                )
+            case "HELO" | "NOOP":
+                return b"250 OK"
+            case "MAIL":
+                self.envelope = {"from": argument[5:], "to": []}
+                return b"250 OK"
+            case "RCPT":
+                self.envelope.setdefault("to", []).append(argument[3:].strip("<>"))
+                return b"250 OK"
+            case "DATA":
+                if not self.envelope.get("to"):
+                    return b"554 No valid recipients"
+                self.data = b""
+                return b"354 End data with <CR><LF>.<CR><LF>"
+            case "RSET":
+                self.envelope = {}
+                return b"250 OK"
+            case "QUIT":
+                return b"221 Bye"
+        return b"502 Command not implemented"
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Local SMTP server that stores messages and delays its replies."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, extensions=("8BITMIME", "SIZE 0"), latency=0):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.extensions = list(extensions)
+        self.latency = latency
+        self.messages = []
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
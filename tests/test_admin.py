@@ -0,0 +1,81 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from emark import admin, models
+from model_bakery import baker
+
+
+class TestEstimatedCountPaginator:
+    @pytest.mark.django_db
+    def test_count(self):
+        baker.make(models.Send, _quantity=3)
+        paginator = admin.EstimatedCountPaginator(models.Send.objects.order_by("pk"), 2)
+        assert paginator.get_estimate() is None
+        assert paginator.count == 3
+
+    @pytest.mark.django_db
+    def test_count__estimate(self, monkeypatch):
+        monkeypatch.setattr(
+            admin.EstimatedCountPaginator, "get_estimate", lambda self: 10**6
+        )
+        paginator = admin.EstimatedCountPaginator(models.Send.objects.order_by("pk"), 2)
+        assert paginator.count == 10**6
+        assert paginator.num_pages == 500_000
+
+    @pytest.mark.django_db
+    def test_count__small_estimate(self, monkeypatch):
+        baker.make(models.Send, _quantity=3)
+        monkeypatch.setattr(
+            admin.EstimatedCountPaginator, "get_estimate", lambda self: 10
+        )
+        paginator = admin.EstimatedCountPaginator(models.Send.objects.order_by("pk"), 2)
+        assert paginator.count == 3
+
+    def test_get_estimate__list(self):
+        assert admin.EstimatedCountPaginator([1, 2, 3], 2).get_estimate() is None
+
+
+@pytest.mark.django_db
+class TestSendAdmin:
+    def test_changelist(self, admin_client):
+        baker.make(
+            models.Send, subject="Hello", html="<html>", body="body", _quantity=2
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = admin_client.get("/admin/emark/send/")
+        assert response.status_code == 200
+        assert b"Hello" in response.content
+        selects = [
+            query["sql"]
+            for query in queries
+            if '"emark_send"."subject"' in query["sql"]
+        ]
+        assert selects
+        assert all('"emark_send"."html"' not in sql for sql in selects)
+        assert all('"emark_send"."body"' not in sql for sql in selects)
+
+    def test_change(self, admin_client):
+        send = baker.make(models.Send, html="<html>", body="Hello body")
+        response = admin_client.get(f"/admin/emark/send/{send.pk}/change/")
+        assert response.status_code == 200
+        assert b"Hello body" in response.content
+
+
+@pytest.mark.django_db
+class TestOpenAdmin:
+    def test_changelist(self, admin_client):
+        baker.make(models.Open, ip_address="127.0.0.1")
+        response = admin_client.get("/admin/emark/open/")
+        assert response.status_code == 200
+        assert b"127.0.0.1" in response.content
+
+
+@pytest.mark.django_db
+class TestClickAdmin:
+    def test_changelist(self, admin_client):
+        baker.make(
+            models.Click, ip_address="127.0.0.1", redirect_url="https://example.com"
+        )
+        response = admin_client.get("/admin/emark/click/")
+        assert response.status_code == 200
+        assert b"https://example.com" in response.content
@@ -1,13 +1,44 @@
+import copy
 import io
 import smtplib
 from unittest.mock import MagicMock, Mock
 
 import pytest
 from django.core.mail import EmailMessage, EmailMultiAlternatives
-from emark import backends
+from django.utils import translation
+from emark import backends, metrics, signals
 from emark.models import Send
 
 
+class TestRenderMessages:
+    def test_render_messages(self, email_message, monkeypatch):
+        messages = [copy.copy(email_message) for _ in range(3)]
+        messages[1].language = "de"
+        override = Mock(wraps=translation.override)
+        monkeypatch.setattr(translation, "override", override)
+        native_email = EmailMessage(body="foo")
+
+        backends.render_messages([*messages, native_email])
+
+        assert [call.args[0] for call in override.call_args_list] == ["de", "en-US"]
+        assert all(message.html for message in messages)
+        assert not messages[0].uuid
+
+    def test_render_messages__tracking(self, email_message):
+        backends.render_messages([email_message], tracking=True)
+
+        assert email_message.uuid
+
+    def test_render_messages__rendered(self, email_message, monkeypatch):
+        email_message.render()
+        render = Mock()
+        monkeypatch.setattr(email_message, "render", render)
+
+        backends.render_messages([email_message], tracking=True)
+
+        render.assert_not_called()
+
+
 class TestConsoleEmailBackend:
     def test_mailers(self, email_message, settings):
         pytest.importorskip("django", minversion="6.1")
@@ -47,6 +78,27 @@ class TestSMTPEmailBackend:
         backend.connection = Mock()
         assert backend.send_messages([email_message]) == 1
 
+    def test_send__messages_sent(self, email_message):
+        class TestBackend(backends.SMTPEmailBackend):
+            def _send(self, message):
+                return bool(message.html)
+
+        receiver = Mock()
+        signals.messages_sent.connect(receiver)
+        try:
+            backend = TestBackend(alias="default", host="localhost")
+            backend.connection = Mock()
+            assert backend.send_messages([email_message]) == 1
+        finally:
+            signals.messages_sent.disconnect(receiver)
+        receiver.assert_called_once()
+        kwargs = receiver.call_args.kwargs
+        assert kwargs["sender"] is TestBackend
+        assert kwargs["backend"] is backend
+        assert kwargs["messages"] == [email_message]
+        assert kwargs["sent"] == 1
+        assert kwargs["duration"] >= 0
+
 
 class TestTrackingConsoleEmailBackend:
     @pytest.mark.django_db
@@ -63,6 +115,18 @@ class TestTrackingConsoleEmailBackend:
         assert Send.objects.count() == 1
         obj = Send.objects.get()
         assert str(obj.uuid) in obj.body
+        assert obj.language == "en-US"
+        assert obj.campaign == "MARKDOWN_EMAIL_TEST"
+
+    @pytest.mark.django_db
+    def test_send__long_campaign(self, email_message):
+        email_message.utm_params = {"utm_campaign": "x" * 300}
+        with io.StringIO() as stream:
+            backend = backends.TrackingConsoleEmailBackend(stream=stream)
+            assert backend.send_messages([email_message]) == 1
+        obj = Send.objects.get()
+        assert obj.campaign == "x" * 255
+        assert obj.utm["utm_campaign"] == "x" * 300
 
     @pytest.mark.django_db
     def test_send__with_user(self, admin_user, email_message):
@@ -194,6 +258,34 @@ class TestTrackingSMTPEmailBackend:
         assert backend.connection.sendmail.call_count == 1
         assert not Send.objects.exists()
 
+    @pytest.mark.django_db
+    def test_send__metrics(self, email_message, settings):
+        settings.EMARK = {
+            "DOMAIN": "www.example.com",
+            "METRICS": "emark.metrics.InMemoryMetrics",
+        }
+
+        class TestBackend(backends.TrackingSMTPEmailBackend):
+            connection_class = MagicMock
+
+        backend = TestBackend(alias="default", host="localhost", fail_silently=True)
+        backend.connection = Mock()
+        failing_message = copy.copy(email_message)
+        failing_message.to = ["dr.strange@avengers.com"]
+        backend.connection.sendmail.side_effect = [{}, smtplib.SMTPException]
+        assert backend.send_messages([email_message, failing_message]) == 1
+
+        sink = metrics.get_metrics()
+        labels = {"email": "MarkdownEmailTest"}
+        assert sink.get_counter("messages_rendered", **labels) == 2
+        assert sink.get_histogram("render_duration_seconds", **labels).count == 2
+        assert sink.get_histogram("html_size_bytes", **labels).count == 2
+        backend_labels = {"backend": TestBackend.__qualname__}
+        assert sink.get_histogram("batch_size", **backend_labels).sum == 2
+        assert sink.get_counter("messages_sent", **backend_labels) == 1
+        assert sink.get_histogram("smtp_duration_seconds").count == 2
+        assert sink.get_counter("send_failures") == 1
+
     @pytest.mark.django_db
     def test_send__fail_silently_wo_error(self, email_message):
         email_message.to = [
@@ -0,0 +1,71 @@
+import types
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from emark import checks, conf
+
+
+class TestSettings:
+    def test_defaults(self):
+        emark_settings = conf.Settings()
+        assert emark_settings.UTM_PARAMS == {
+            "utm_source": "website",
+            "utm_medium": "email",
+        }
+        assert isinstance(emark_settings.UTM_PARAMS, types.MappingProxyType)
+        assert emark_settings.TRACKING_HEADERS == ("User-Agent", "Referer")
+
+    def test_frozen(self):
+        with pytest.raises(AttributeError):
+            conf.Settings().DOMAIN = "example.com"
+
+    def test_coerce(self):
+        emark_settings = conf.Settings(TRACKING_FILTERS=["path.to.filter"])
+        assert emark_settings.TRACKING_FILTERS == ("path.to.filter",)
+
+    @pytest.mark.parametrize(
+        "options, message",
+        [
+            ({"DOMAIN": 1}, "EMARK['DOMAIN'] must be of type str | None."),
+            ({"SHORT_LINKS": 1}, "EMARK['SHORT_LINKS'] must be of type bool."),
+            ({"UTM_PARAMS": []}, "EMARK['UTM_PARAMS'] must be a dictionary."),
+            (
+                {"TRACKING_HEADERS": "User-Agent"},
+                "EMARK['TRACKING_HEADERS'] must be a list of strings.",
+            ),
+            (
+                {"TRACKING_DEDUPLICATION_WINDOW": True},
+                "EMARK['TRACKING_DEDUPLICATION_WINDOW'] must be an integer or None.",
+            ),
+            (
+                {"TRACKING_FILTER_ACTION": "ignore"},
+                "EMARK['TRACKING_FILTER_ACTION'] must be either 'drop' or 'count'.",
+            ),
+        ],
+    )
+    def test_invalid(self, options, message):
+        with pytest.raises(ImproperlyConfigured) as e:
+            conf.Settings(**options)
+        assert str(e.value) == message
+
+
+class TestGetSettings:
+    def test_cached(self, settings):
+        settings.EMARK = {"DOMAIN": "example.com"}
+        assert conf.get_settings() is conf.get_settings()
+        assert conf.get_settings().DOMAIN == "example.com"
+        settings.EMARK = {"DOMAIN": "www.example.com"}
+        assert conf.get_settings().DOMAIN == "www.example.com"
+
+    def test_unknown(self, settings):
+        settings.EMARK = {"DOMIAN": "example.com", "UTM": {}}
+        with pytest.raises(ImproperlyConfigured) as e:
+            conf.get_settings()
+        assert str(e.value) == "Unknown EMARK setting(s): DOMIAN, UTM"
+
+
+def test_check_settings(settings):
+    assert checks.check_settings(None) == []
+    settings.EMARK = {"DOMIAN": "example.com"}
+    errors = checks.check_settings(None)
+    assert [error.id for error in errors] == ["emark.E001"]
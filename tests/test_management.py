@@ -0,0 +1,206 @@
+import datetime
+import gzip
+import io
+import json
+from unittest.mock import Mock
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from emark import models
+from model_bakery import baker
+
+
+class TestReconcileCommand:
+    @pytest.mark.django_db
+    def test_handle(self):
+        msgs = baker.make("emark.Send", _quantity=3)
+        baker.make("emark.Open", email=msgs[0], _quantity=2)
+        baker.make("emark.Click", email=msgs[1])
+        stdout = io.StringIO()
+        call_command("emark_reconcile", batch_size=2, stdout=stdout)
+        assert stdout.getvalue() == "Reconciled 3 emails.\n"
+        assert models.Send.objects.get(pk=msgs[0].pk).open_count == 2
+        assert models.Send.objects.get(pk=msgs[1].pk).click_count == 1
+
+    @pytest.mark.django_db
+    def test_handle__days(self):
+        baker.make("emark.Send")
+        stdout = io.StringIO()
+        call_command("emark_reconcile", days=0, stdout=stdout)
+        assert stdout.getvalue() == "Reconciled 0 emails.\n"
+
+
+class TestRollupCommand:
+    @pytest.mark.django_db
+    def test_handle__empty(self):
+        stdout = io.StringIO()
+        call_command("emark_rollup", stdout=stdout)
+        assert stdout.getvalue() == "Nothing to roll up.\n"
+        assert not models.DailyRollup.objects.exists()
+
+    @pytest.mark.django_db
+    def test_handle(self):
+        msg = baker.make("emark.Send", campaign="WELCOME_EMAIL", language="de")
+        baker.make("emark.Send", campaign="WELCOME_EMAIL", language="en")
+        baker.make("emark.Send")
+        baker.make("emark.Open", email=msg, _quantity=3)
+        baker.make("emark.Click", email=msg)
+        stdout = io.StringIO()
+        call_command("emark_rollup", stdout=stdout)
+        call_command("emark_rollup", stdout=stdout)  # idempotent
+
+        assert models.DailyRollup.objects.count() == 3
+        rollup = models.DailyRollup.objects.get(campaign="WELCOME_EMAIL", language="de")
+        assert rollup.sends == 1
+        assert rollup.unique_opens == 1
+        assert rollup.unique_clicks == 1
+        rollup = models.DailyRollup.objects.get(campaign="WELCOME_EMAIL", language="en")
+        assert rollup.sends == 1
+        assert rollup.unique_opens == 0
+        assert models.DailyRollup.objects.get(campaign="").sends == 1
+
+    @pytest.mark.django_db
+    def test_handle__since(self):
+        baker.make("emark.Send")
+        stdout = io.StringIO()
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        call_command("emark_rollup", "--since", yesterday.isoformat(), stdout=stdout)
+        assert f"Rolled up 0 rows for {yesterday.isoformat()}." in stdout.getvalue()
+        assert models.DailyRollup.objects.get().sends == 1
+
+
+class TestPurgeCommand:
+    @pytest.fixture
+    def old_email(self):
+        msg = baker.make("emark.Send", subject="Old")
+        baker.make("emark.Open", email=msg, _quantity=3)
+        baker.make("emark.Click", email=msg, _quantity=2)
+        models.Send.objects.filter(pk=msg.pk).update(
+            created_at=timezone.now() - datetime.timedelta(days=200)
+        )
+        return msg
+
+    @pytest.mark.django_db
+    def test_handle(self, old_email):
+        new_email = baker.make("emark.Send")
+        baker.make("emark.Open", email=new_email)
+        stdout = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                "emark_purge",
+                "--older-than=180d",
+                "--batch-size=2",
+                "--sleep=0",
+                stdout=stdout,
+            )
+        assert stdout.getvalue() == "Purged 1 emails and 0 links.\n"
+        assert list(models.Send.objects.all()) == [new_email]
+        assert models.Open.objects.get().email == new_email
+        assert not models.Click.objects.exists()
+        # the emails are deleted without loading their bodies
+        assert not any('"emark_send"."html"' in query["sql"] for query in queries)
+
+    @pytest.mark.django_db
+    def test_handle__archive(self, old_email, tmp_path):
+        archive = tmp_path / "emark.jsonl.gz"
+        call_command(
+            "emark_purge",
+            "--older-than=4w",
+            "--sleep=0",
+            f"--archive={archive}",
+            stdout=io.StringIO(),
+        )
+        assert not models.Send.objects.exists()
+        with gzip.open(archive, "rt") as f:
+            rows = [json.loads(line) for line in f]
+        assert [row["model"] for row in rows] == ["emark.send"] + ["emark.open"] * 3 + [
+            "emark.click"
+        ] * 2
+        assert rows[0]["fields"]["subject"] == "Old"
+        assert rows[1]["fields"]["email_id"] == str(old_email.pk)
+
+    @pytest.mark.django_db
+    def test_handle__archive__error(self, old_email, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            models.SendQuerySet, "_raw_delete", Mock(side_effect=DatabaseError)
+        )
+        rows = {
+            (model._meta.label_lower, str(pk))
+            for model in [models.Send, models.Open, models.Click]
+            for pk in model.objects.values_list("pk", flat=True)
+        }
+        archive = tmp_path / "emark.jsonl.gz"
+        with pytest.raises(DatabaseError):
+            call_command(
+                "emark_purge",
+                "--older-than=4w",
+                "--sleep=0",
+                f"--archive={archive}",
+                stdout=io.StringIO(),
+            )
+        assert models.Send.objects.exists()
+        assert not models.Open.objects.exists()
+        assert not models.Click.objects.exists()
+        # all rows, including the deleted ones, have been archived first
+        with gzip.open(archive, "rt") as f:
+            archived = {
+                (row["model"], str(row["fields"]["uuid"])) for row in map(json.loads, f)
+            }
+        assert archived == rows
+
+    @pytest.mark.django_db
+    def test_handle__archive__append(self, old_email, tmp_path):
+        archive = tmp_path / "emark.jsonl.gz"
+        for subject in ["Older", "Old"]:
+            call_command(
+                "emark_purge",
+                "--older-than=4w",
+                "--sleep=0",
+                f"--archive={archive}",
+                stdout=io.StringIO(),
+            )
+            baker.make("emark.Send", subject=subject)
+            models.Send.objects.update(
+                created_at=timezone.now() - datetime.timedelta(days=200)
+            )
+        call_command(
+            "emark_purge",
+            "--older-than=4w",
+            "--sleep=0",
+            f"--archive={archive}",
+            stdout=io.StringIO(),
+        )
+        with gzip.open(archive, "rt") as f:
+            subjects = [
+                row["fields"]["subject"]
+                for row in map(json.loads, f)
+                if row["model"] == "emark.send"
+            ]
+        assert subjects == ["Old", "Older", "Old"]
+
+    @pytest.mark.django_db
+    def test_handle__links(self, old_email):
+        old = timezone.now() - datetime.timedelta(days=200)
+        stale, clicked, recent = baker.make("emark.Link", _quantity=3)
+        models.Link.objects.update(last_used_at=old)
+        models.Link.objects.filter(pk=recent.pk).update(last_used_at=timezone.now())
+        baker.make("emark.Click", link=clicked)
+        stdout = io.StringIO()
+        call_command("emark_purge", "--older-than=180d", "--sleep=0", stdout=stdout)
+        assert stdout.getvalue() == "Purged 1 emails and 1 links.\n"
+        assert set(models.Link.objects.all()) == {clicked, recent}
+
+    def test_handle__invalid_age(self):
+        with pytest.raises(CommandError, match="Invalid age '180'"):
+            call_command("emark_purge", "--older-than=180")
+
+
+class TestWarmupCommand:
+    def test_handle(self, settings):
+        settings.LANGUAGES = [("en", "English")]
+        stdout = io.StringIO()
+        call_command("emark_warmup", stdout=stdout)
+        assert stdout.getvalue() == "Warmed up 0 emails in 1 languages.\n"
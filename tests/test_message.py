@@ -1,13 +1,23 @@
 import copy
 from pathlib import Path
+from unittest.mock import Mock
 
 import emark.message
 import pytest
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
 from django.core.exceptions import ImproperlyConfigured
+from django.template import Engine
 from django.test.html import parse_html
+from django.urls import set_script_prefix
+from django.utils import autoreload, translation
+from emark import backends, signals, tracking
+from emark.models import Link
 from model_bakery import baker
 
+from tests.testapp.models import ContactUser
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
@@ -126,6 +136,122 @@ class TestMarkdownEmail:
         )
         assert email.to == ['"Tony Stark" <ironman@avengers.com>']
 
+    @pytest.mark.django_db
+    def test_to_users(self, django_assert_num_queries):
+        baker.make(settings.AUTH_USER_MODEL, email="a@a.com", first_name="Peter")
+        baker.make(settings.AUTH_USER_MODEL, email="b@b.com", is_active=False)
+        baker.make(settings.AUTH_USER_MODEL, email="")
+
+        with django_assert_num_queries(1):
+            emails = list(
+                MarkdownEmailTest.to_users(
+                    get_user_model().objects.all(), subject="Donuts"
+                )
+            )
+
+        assert [email.to for email in emails] == [['"Peter" <a@a.com>']]
+        assert emails[0].context["short_name"] == "Peter"
+        assert emails[0].language == settings.LANGUAGE_CODE
+        assert "password" in emails[0].user.get_deferred_fields()
+        assert "username" in emails[0].user.get_deferred_fields()
+
+    @pytest.mark.django_db
+    def test_to_users__fields(self):
+        baker.make(settings.AUTH_USER_MODEL, email="a@a.com", username="peter")
+
+        (email,) = MarkdownEmailTest.to_users(
+            get_user_model().objects.all(),
+            context_fn=lambda user: {"username": user.username},
+            fields=["username"],
+        )
+
+        assert "username" not in email.user.get_deferred_fields()
+        assert email.context["username"] == "peter"
+
+    @pytest.mark.django_db
+    def test_to_users__custom_user_model(self, django_assert_num_queries):
+        baker.make(ContactUser, email_address="a@a.com", name="Peter")
+        baker.make(ContactUser, email_address="")
+
+        with django_assert_num_queries(1):
+            (email,) = MarkdownEmailTest.to_users(
+                ContactUser.objects.all(), language="en", fields=["name"]
+            )
+
+        assert email.to == ['"Peter" <a@a.com>']
+        assert email.context["short_name"] == "Peter"
+
+    @pytest.mark.django_db
+    def test_send_bulk(self, mailoutbox):
+        baker.make(
+            settings.AUTH_USER_MODEL, email=iter(["a@a.com", "b@b.com"]), _quantity=2
+        )
+        baker.make(
+            settings.AUTH_USER_MODEL, email="inactive@example.com", is_active=False
+        )
+        baker.make(settings.AUTH_USER_MODEL, email="")
+        baker.make(settings.AUTH_USER_MODEL, email="opt-out@example.com")
+        User = get_user_model()
+
+        result = MarkdownEmailTest.send_bulk(
+            User.objects.order_by("pk"),
+            context_fn=lambda user: (
+                None
+                if user.email == "opt-out@example.com"
+                else {"donut_name": user.email}
+            ),
+            subject="Donuts",
+        )
+
+        assert result == emark.message.BulkResult(sent=2, failed=0, skipped=1)
+        assert [m.to for m in mailoutbox] == [['"" <a@a.com>'], ['"" <b@b.com>']]
+        assert "a@a.com" in mailoutbox[0].body
+
+    @pytest.mark.django_db
+    def test_send_bulk__chunks(self):
+        baker.make(settings.AUTH_USER_MODEL, email="a@example.com", _quantity=5)
+        connection = mail.get_connection()
+        connection.send_messages = Mock(side_effect=lambda messages: len(messages) - 1)
+
+        result = MarkdownEmailTest.send_bulk(
+            get_user_model().objects.all(),
+            chunk_size=2,
+            connection=connection,
+            subject="Donuts",
+        )
+
+        assert [len(c.args[0]) for c in connection.send_messages.call_args_list] == [
+            2,
+            2,
+            1,
+        ]
+        assert result == emark.message.BulkResult(sent=2, failed=3, skipped=0)
+
+    @pytest.mark.django_db
+    def test_send_bulk__render_before_open(self, monkeypatch):
+        baker.make(settings.AUTH_USER_MODEL, email="a@example.com", _quantity=3)
+        events = []
+        monkeypatch.setattr(
+            backends,
+            "render_messages",
+            lambda messages, tracking: events.append("render"),
+        )
+        connection = mail.get_connection()
+        connection.open = Mock(side_effect=lambda: events.append("open"))
+        connection.send_messages = Mock(
+            side_effect=lambda messages: events.append("send") or len(messages)
+        )
+
+        result = MarkdownEmailTest.send_bulk(
+            get_user_model().objects.all(),
+            chunk_size=2,
+            connection=connection,
+            subject="Donuts",
+        )
+
+        assert result.sent == 3
+        assert events == ["render", "open", "send"] * 2
+
     def test_email(self, email_message):
         email_message.message()
         assert email_message.subject == "Peanut strikes back"
@@ -173,6 +299,70 @@ class TestMarkdownEmail:
         )
         assert message_text in email_message.body
 
+    def test_render__stage_rendered(self, email_message):
+        stages = []
+
+        def receiver(sender, message, stage, duration, size, language, **kwargs):
+            assert sender is MarkdownEmailTest
+            assert message is email_message
+            assert duration >= 0
+            assert size > 0
+            assert language == "en-US"
+            stages.append(stage)
+
+        signals.stage_rendered.connect(receiver)
+        try:
+            email_message.render()
+        finally:
+            signals.stage_rendered.disconnect(receiver)
+        assert stages == ["template", "utm", "markdown", "layout", "inline", "text"]
+
+    def test_render__minify_html(self, email_message, settings):
+        settings.EMARK = {"DOMAIN": "www.example.com", "MINIFY_HTML": True}
+        stages = []
+
+        def receiver(sender, stage, **kwargs):
+            stages.append(stage)
+
+        signals.stage_rendered.connect(receiver)
+        try:
+            msg = email_message.message()
+        finally:
+            signals.stage_rendered.disconnect(receiver)
+        assert "minify" in stages
+        assert "<!-- START CENTERED WHITE CONTAINER -->" not in email_message.html
+        assert "\n  " not in email_message.html
+        assert email_message.html_size == len(email_message.html.encode())
+        html_part = msg.get_payload(1)
+        assert html_part["Content-Transfer-Encoding"] == "8bit"
+
+    def test_render__long_lines(self, email_message, settings):
+        settings.EMARK = {"MINIFY_HTML": True}
+        email_message.context["donut_name"] = "Nutty Donut " * 200
+        msg = email_message.message()
+        assert all(len(line) <= 998 for line in email_message.html.splitlines())
+        assert msg.get_payload(1)["Content-Transfer-Encoding"] == "8bit"
+
+    def test_render__html_size_budget(self, email_message, settings, caplog):
+        settings.EMARK = {"DOMAIN": "www.example.com", "HTML_SIZE_BUDGET": 1000}
+        email_message.render()
+        assert email_message.html_size > 1000
+        assert (
+            f"MarkdownEmailTest has {email_message.html_size} bytes of HTML,"
+            " which exceeds the budget of 1000 bytes." in caplog.text
+        )
+
+    def test_override_language(self, email_message):
+        with translation.override("de"):
+            assert isinstance(email_message.override_language(), translation.override)
+        with translation.override("en-us"):
+            assert not isinstance(
+                email_message.override_language(), translation.override
+            )
+
+    def test_measure__no_receivers(self, email_message):
+        assert email_message.measure("text", str.upper, "donut") == "DONUT"
+
     def test_open_tracking(self, email_message):
         email_message.render("12341234-1234-1234-1234-123412341234")
         assert (
@@ -308,6 +498,129 @@ class TestMarkdownEmail:
             == "MARKDOWN_EMAIL_TEST_WITH_SUBJECT"
         )
 
+    def test_get_spec(self, settings):
+        spec = MarkdownEmailTestWithSubject.get_spec()
+        assert MarkdownEmailTestWithSubject.get_spec() is spec
+        assert MarkdownEmailTest.get_spec() is not spec
+        assert spec.campaign_name == "MARKDOWN_EMAIL_TEST_WITH_SUBJECT"
+        assert spec.template.template.name == "template.md"
+        assert spec.get_template("template.md") is spec.template
+        assert spec.get_template("emark/base.html") is spec.base_template
+        assert (
+            spec.get_tracking_path("email-open", "12341234-1234-1234-1234-123412341234")
+            == "/emark/12341234-1234-1234-1234-123412341234/open"
+        )
+
+        settings.EMARK = {"UTM_PARAMS": {"utm_source": "newsletter"}}
+        spec = MarkdownEmailTestWithSubject.get_spec()
+        assert spec.utm_params == {
+            "utm_source": "newsletter",
+            "utm_campaign": "MARKDOWN_EMAIL_TEST_WITH_SUBJECT",
+        }
+
+    def test_get_spec__file_changed(self):
+        spec = MarkdownEmailTest.get_spec()
+        autoreload.file_changed.send(sender=None, file_path=BASE_DIR / "template.md")
+        assert MarkdownEmailTest.get_spec() is not spec
+
+    def test_render_preview(self, monkeypatch):
+        build_preview = Mock(return_value="<html></html>")
+        monkeypatch.setattr(MarkdownEmailTest, "build_preview", build_preview)
+        assert MarkdownEmailTest.render_preview() == "<html></html>"
+        assert MarkdownEmailTest.render_preview() == "<html></html>"
+        assert build_preview.call_count == 1
+        MarkdownEmailTest.render_preview("de")
+        assert build_preview.call_count == 2
+
+    def test_render_preview__template_changed(self, settings):
+        def set_templates(styles):
+            settings.TEMPLATES = [
+                {
+                    "BACKEND": "django.template.backends.django.DjangoTemplates",
+                    "OPTIONS": {
+                        "loaders": [
+                            (
+                                "django.template.loaders.locmem.Loader",
+                                {
+                                    "template.md": "# Hello",
+                                    "emark/base.html": (
+                                        "<style>{% include 'styles.css' %}</style>"
+                                        "{{ markdown_string }}"
+                                    ),
+                                    "styles.css": styles,
+                                },
+                            )
+                        ],
+                    },
+                }
+            ]
+
+        set_templates("h1 { color: red; }")
+        version = MarkdownEmailTest.get_spec().template_version
+        assert "red" in MarkdownEmailTest.render_preview()
+
+        set_templates("h1 { color: blue; }")
+        assert MarkdownEmailTest.get_spec().template_version != version
+        assert "blue" in MarkdownEmailTest.render_preview()
+
+    def test_get_template_dependencies(self):
+        engine = Engine(
+            loaders=[
+                (
+                    "django.template.loaders.locmem.Loader",
+                    {
+                        "email.html": (
+                            "{% extends 'base.html' %}"
+                            "{% block content %}{% include 'partial.html' %}"
+                            "{% include name %}{% endblock %}"
+                        ),
+                        "base.html": "{% extends 'base.html' %}",
+                        "partial.html": "partial",
+                    },
+                ),
+                (
+                    "django.template.loaders.locmem.Loader",
+                    {"base.html": "{% block content %}{% endblock %}"},
+                ),
+            ]
+        )
+        dependencies = emark.message.get_template_dependencies(
+            engine.get_template("email.html")
+        )
+        assert [template.source for template in dependencies] == [
+            "{% extends 'base.html' %}"
+            "{% block content %}{% include 'partial.html' %}"
+            "{% include name %}{% endblock %}",
+            "{% extends 'base.html' %}",
+            "partial",
+            "{% block content %}{% endblock %}",
+        ]
+
+    def test_get_tracking_path__script_prefix(self):
+        spec = MarkdownEmailTest.get_spec()
+        pk = "12341234-1234-1234-1234-123412341234"
+        assert spec.get_tracking_path("email-open", pk) == f"/emark/{pk}/open"
+        set_script_prefix("/app/")
+        try:
+            assert spec.get_tracking_path("email-open", pk) == f"/app/emark/{pk}/open"
+        finally:
+            set_script_prefix("/")
+
+    def test_render__i18n_patterns(self, settings, email_message):
+        settings.ROOT_URLCONF = "tests.testapp.i18n_urls"
+        settings.EMARK = {"DOMAIN": "www.example.com"}
+        german_message = copy.copy(email_message)
+        german_message.language = "de"
+        email_message.render(tracking_uuid="12341234-1234-1234-1234-123412341234")
+        german_message.render(tracking_uuid="43214321-4321-4321-4321-432143214321")
+        assert (
+            "/en-us/emark/12341234-1234-1234-1234-123412341234/open"
+            in email_message.html
+        )
+        assert (
+            "/de/emark/43214321-4321-4321-4321-432143214321/open" in german_message.html
+        )
+
     def test_get_utm_params(self):
         assert MarkdownEmailTestWithSubject(language="en").get_utm_params() == {
             "utm_campaign": "MARKDOWN_EMAIL_TEST_WITH_SUBJECT",
@@ -347,7 +660,7 @@ class TestMarkdownEmail:
         ["www.example.com", "example.com", "test.example.com", "localhost:8000"],
     )
     def test_update_url_params__domains(self, settings, email_message, domain):
-        settings.EMARK["DOMAIN"] = domain
+        settings.EMARK = {"DOMAIN": domain}
         email_message.uuid = "12341234-1234-1234-1234-123412341234"
         encoded_domain = domain.replace(":", "%3A")
         expected_url = (
@@ -362,7 +675,7 @@ class TestMarkdownEmail:
         )
 
     def test_update_url_params__subdomain(self, settings, email_message):
-        settings.EMARK["DOMAIN"] = "www.example.com"
+        settings.EMARK = {"DOMAIN": "www.example.com"}
         email_message.uuid = "12341234-1234-1234-1234-123412341234"
         assert (
             email_message.update_url_params(
@@ -372,6 +685,57 @@ class TestMarkdownEmail:
             == "https://test.example.com/?utm_medium=baz&utm_source=foo"
         )
 
+    def test_update_url_params__signed(self, settings, email_message):
+        settings.EMARK = {"DOMAIN": "www.example.com", "SIGNED_TRACKING_URLS": True}
+        email_message.uuid = "12341234-1234-1234-1234-123412341234"
+        url = email_message.update_url_params("https://google.com/", utm_medium="baz")
+        signature = tracking.sign_url(
+            email_message.uuid, "https://google.com/?utm_medium=baz"
+        )
+        assert url == (
+            "http://www.example.com/emark/12341234-1234-1234-1234-123412341234/"
+            f"click?url=https%3A%2F%2Fgoogle.com%2F%3Futm_medium%3Dbaz&sig={signature}"
+        )
+
+    @pytest.mark.django_db
+    def test_update_url_params__short_links(self, settings, email_message):
+        settings.EMARK = {"DOMAIN": "www.example.com", "SHORT_LINKS": True}
+        email_message.uuid = "12341234-1234-1234-1234-123412341234"
+        url = email_message.update_url_params("https://google.com/", utm_medium="baz")
+        link = Link.objects.get()
+        assert link.url == "https://google.com/?utm_medium=baz"
+        assert link.campaign == "MARKDOWN_EMAIL_TEST"
+        assert url == (
+            "http://www.example.com/emark/12341234-1234-1234-1234-123412341234/"
+            f"c/{tracking.sign_link(email_message.uuid, link.short_id)}"
+        )
+
+    @pytest.mark.django_db
+    def test_inject_utm_params__short_links(
+        self, settings, email_message, django_assert_num_queries
+    ):
+        settings.EMARK = {"DOMAIN": "www.example.com", "SHORT_LINKS": True}
+        email_message.uuid = "12341234-1234-1234-1234-123412341234"
+        with django_assert_num_queries(2):
+            md = email_message.inject_utm_params(
+                "[A](https://a.example.com) [B](/b) [A](https://a.example.com)"
+                ' <a href="/b">B</a> [tel](tel:5552368)',
+                utm_campaign="CAMPAIGN",
+            )
+        links = {link.url: link for link in Link.objects.all()}
+        assert set(links) == {
+            "https://a.example.com?utm_campaign=CAMPAIGN",
+            "/b?utm_campaign=CAMPAIGN",
+        }
+        token = tracking.sign_link(
+            email_message.uuid, links["/b?utm_campaign=CAMPAIGN"].short_id
+        )
+        assert (
+            f'<a href="http://www.example.com/emark/12341234-1234-1234-1234-123412341234/c/{token}">'
+            in md
+        )
+        assert "(tel:5552368)" in md
+
     def test_update_url_params__external_resource(self, email_message):
         email_message.uuid = "12341234-1234-1234-1234-123412341234"
         assert (
@@ -0,0 +1,92 @@
+import pytest
+from emark import metrics
+
+
+class TestMetrics:
+    def test_noop(self):
+        sink = metrics.Metrics()
+        sink.incr("messages_sent", backend="SMTPEmailBackend")
+        sink.observe("batch_size", 10)
+        with sink.timer("render_duration_seconds"):
+            pass
+
+
+class TestInMemoryMetrics:
+    def test_incr(self):
+        sink = metrics.InMemoryMetrics()
+        sink.incr("messages_sent", backend="SMTP")
+        sink.incr("messages_sent", 2, backend="SMTP")
+        sink.incr("messages_sent", backend="Console")
+        assert sink.get_counter("messages_sent", backend="SMTP") == 3
+        assert sink.get_counter("messages_sent", backend="Console") == 1
+        assert sink.get_counter("messages_sent") == 0
+
+    def test_observe(self):
+        sink = metrics.InMemoryMetrics()
+        sink.observe("render_duration_seconds", 0.004)
+        sink.observe("render_duration_seconds", 0.2)
+        sink.observe("render_duration_seconds", 20)
+        histogram = sink.get_histogram("render_duration_seconds")
+        assert histogram.count == 3
+        assert histogram.sum == pytest.approx(20.204)
+        assert histogram.counts[0] == 1
+        assert histogram.counts[-1] == 1
+        assert sink.get_histogram("batch_size") is None
+
+    def test_observe__buckets(self):
+        sink = metrics.InMemoryMetrics()
+        sink.observe("batch_size", 50)
+        histogram = sink.get_histogram("batch_size")
+        assert histogram.buckets == metrics.SIZE_BUCKETS
+        assert histogram.counts[3] == 1
+
+    def test_timer(self):
+        sink = metrics.InMemoryMetrics()
+        with sink.timer("smtp_duration_seconds", backend="SMTP"):
+            pass
+        with pytest.raises(ValueError), sink.timer("smtp_duration_seconds"):
+            raise ValueError()
+        assert sink.get_histogram("smtp_duration_seconds", backend="SMTP").count == 1
+        assert sink.get_histogram("smtp_duration_seconds") is None
+
+
+class TestPrometheusMetrics:
+    def test_render(self):
+        sink = metrics.PrometheusMetrics()
+        sink.incr("tracking_events", event="open", status="tracked")
+        sink.incr("tracking_events", event="click", status='"quoted"')
+        sink.observe("batch_size", 3)
+        assert sink.render() == "\n".join(
+            [
+                "# TYPE emark_tracking_events_total counter",
+                'emark_tracking_events_total{event="click",status="\\"quoted\\""} 1',
+                'emark_tracking_events_total{event="open",status="tracked"} 1',
+                "# TYPE emark_batch_size histogram",
+                'emark_batch_size_bucket{le="1"} 0',
+                'emark_batch_size_bucket{le="5"} 1',
+                'emark_batch_size_bucket{le="10"} 1',
+                'emark_batch_size_bucket{le="50"} 1',
+                'emark_batch_size_bucket{le="100"} 1',
+                'emark_batch_size_bucket{le="500"} 1',
+                'emark_batch_size_bucket{le="1000"} 1',
+                'emark_batch_size_bucket{le="5000"} 1',
+                'emark_batch_size_bucket{le="+Inf"} 1',
+                "emark_batch_size_sum 3",
+                "emark_batch_size_count 1",
+                "",
+            ]
+        )
+
+    def test_render__empty(self):
+        assert metrics.PrometheusMetrics().render() == "\n"
+
+
+class TestGetMetrics:
+    def test_default(self):
+        assert type(metrics.get_metrics()) is metrics.Metrics
+
+    def test_setting(self, settings):
+        settings.EMARK = {"METRICS": "emark.metrics.InMemoryMetrics"}
+        sink = metrics.get_metrics()
+        assert isinstance(sink, metrics.InMemoryMetrics)
+        assert metrics.get_metrics() is sink
@@ -0,0 +1,178 @@
+import hashlib
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from emark import models
+from model_bakery import baker
+
+
+class TestSendQuerySet:
+    @pytest.mark.django_db
+    def test_reconcile(self):
+        msg = baker.make("emark.Send", open_count=10, click_count=10)
+        untracked = baker.make("emark.Send", open_count=10)
+        baker.make("emark.Open", email=msg, _quantity=2)
+        clicks = baker.make("emark.Click", email=msg, _quantity=3)
+
+        assert models.Send.objects.reconcile() == 2
+
+        msg.refresh_from_db()
+        assert msg.open_count == 2
+        assert msg.first_opened_at == min(
+            o.created_at for o in models.Open.objects.all()
+        )
+        assert msg.click_count == 3
+        assert msg.last_clicked_at == max(c.created_at for c in clicks)
+        untracked.refresh_from_db()
+        assert untracked.open_count == 0
+        assert untracked.first_opened_at is None
+
+
+class TestLinkQuerySet:
+    @pytest.mark.django_db
+    def test_get_short_ids(self, django_assert_num_queries):
+        short_ids = models.Link.objects.get_short_ids(
+            "CAMPAIGN", ["https://example.com/", "/path"]
+        )
+        links = {link.url: link for link in models.Link.objects.all()}
+        assert short_ids == {
+            "https://example.com/": links["https://example.com/"].short_id,
+            "/path": links["/path"].short_id,
+        }
+        with django_assert_num_queries(0):
+            assert (
+                models.Link.objects.get_short_ids("CAMPAIGN", ["/path"])["/path"]
+                == links["/path"].short_id
+            )
+
+    @pytest.mark.django_db
+    def test_get_short_ids__existing(self):
+        link = baker.make(
+            "emark.Link",
+            campaign="CAMPAIGN",
+            url="/path",
+            digest=hashlib.sha256(b"/path").hexdigest(),
+            last_used_at=timezone.now() - timedelta(days=1),
+        )
+        assert models.Link.objects.get_short_ids("CAMPAIGN", ["/path"]) == {
+            "/path": link.short_id
+        }
+        # the link is marked as used, to not be purged
+        old_last_used_at = link.last_used_at
+        link.refresh_from_db()
+        assert link.last_used_at > old_last_used_at
+        other = models.Link.objects.get_short_ids("OTHER", ["/path"])
+        assert other["/path"] != link.short_id
+        assert models.Link.objects.count() == 2
+
+    @pytest.mark.django_db
+    def test_get_short_ids__long_campaign(self):
+        short_ids = models.Link.objects.get_short_ids("x" * 300, ["/path"])
+        link = models.Link.objects.get()
+        assert link.campaign == "x" * 255
+        assert short_ids == {"/path": link.short_id}
+
+
+class TestUserAgentQuerySet:
+    @pytest.mark.django_db
+    def test_intern(self, django_assert_num_queries):
+        pk = models.UserAgent.objects.intern("Mozilla/5.0")
+        with django_assert_num_queries(0):
+            assert models.UserAgent.objects.intern("Mozilla/5.0") == pk
+        assert models.UserAgent.objects.get(pk=pk).value == "Mozilla/5.0"
+        assert models.UserAgent.objects.intern("curl/8.0") != pk
+
+
+class TestClientTrackingQueryset:
+    @pytest.mark.django_db
+    def test_create_for_request(self, rf):
+        msg = baker.make("emark.Send")
+        request = rf.get(
+            "/",
+            HTTP_USER_AGENT="Mozilla/5.0",
+            HTTP_REFERER="https://mail.example.com/",
+            HTTP_ACCEPT="image/*",
+        )
+        obj = models.Open.objects.create_for_request(request, email=msg)
+        assert obj.headers == {"Referer": "https://mail.example.com/"}
+        assert str(obj.user_agent) == "Mozilla/5.0"
+
+    @pytest.mark.django_db
+    def test_create_for_request__headers_setting(self, rf, settings):
+        settings.EMARK = {"TRACKING_HEADERS": ["accept"]}
+        msg = baker.make("emark.Send")
+        request = rf.get("/", HTTP_USER_AGENT="Mozilla/5.0", HTTP_ACCEPT="image/*")
+        obj = models.Open.objects.create_for_request(request, email=msg)
+        assert obj.headers == {"Accept": "image/*"}
+        assert obj.user_agent is None
+
+    @pytest.mark.django_db
+    def test_create_for_request__sample_rate(self, rf, settings):
+        settings.EMARK = {"TRACKING_HEADERS_SAMPLE_RATE": 1}
+        msg = baker.make("emark.Send")
+        request = rf.get("/", HTTP_USER_AGENT="Mozilla/5.0", HTTP_ACCEPT="image/*")
+        obj = models.Open.objects.create_for_request(request, email=msg)
+        assert obj.headers == {
+            "Cookie": "",
+            "User-Agent": "Mozilla/5.0",
+            "Accept": "image/*",
+        }
+        assert str(obj.user_agent) == "Mozilla/5.0"
+
+
+class TestOpen:
+    @pytest.mark.django_db
+    def test_create_for_request(self, rf):
+        msg = baker.make("emark.Send")
+        request = rf.get("/", REMOTE_ADDR="127.0.0.1")
+        first = models.Open.objects.create_for_request(request, email=msg)
+        models.Open.objects.create_for_request(request, email=msg)
+
+        msg.refresh_from_db()
+        assert msg.open_count == 2
+        assert msg.first_opened_at == first.created_at
+
+    @pytest.mark.django_db
+    def test_update_email_counters__out_of_order(self):
+        msg = baker.make("emark.Send")
+        now = timezone.now()
+        for minutes in [5, 10, 1]:
+            email_open = baker.prepare(
+                "emark.Open", email=msg, created_at=now + timedelta(minutes=minutes)
+            )
+            email_open.update_email_counters()
+
+        msg.refresh_from_db()
+        assert msg.open_count == 3
+        assert msg.first_opened_at == now + timedelta(minutes=1)
+
+
+class TestClick:
+    @pytest.mark.django_db
+    def test_create_for_request(self, rf):
+        msg = baker.make("emark.Send")
+        request = rf.get("/", REMOTE_ADDR="127.0.0.1")
+        models.Click.objects.create_for_request(request, email=msg, redirect_url="/")
+        last = models.Click.objects.create_for_request(
+            request, email=msg, redirect_url="/"
+        )
+
+        msg.refresh_from_db()
+        assert msg.click_count == 2
+        assert msg.last_clicked_at == last.created_at
+        assert msg.open_count == 0
+
+    @pytest.mark.django_db
+    def test_update_email_counters__out_of_order(self):
+        msg = baker.make("emark.Send")
+        now = timezone.now()
+        for minutes in [5, 10, 1]:
+            click = baker.prepare(
+                "emark.Click", email=msg, created_at=now + timedelta(minutes=minutes)
+            )
+            click.update_email_counters()
+
+        msg.refresh_from_db()
+        assert msg.click_count == 3
+        assert msg.last_clicked_at == now + timedelta(minutes=10)
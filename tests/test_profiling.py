@@ -0,0 +1,68 @@
+import pstats
+
+import pytest
+from emark import profiling
+
+from tests.test_message import MarkdownEmailTest
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    yield
+    profiling.reset_stats()
+
+
+def fibonacci(n):
+    return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+
+def compute():
+    return sum(fibonacci(n) for n in range(15))
+
+
+class TestProfile:
+    def test_disabled(self):
+        with profiling.profile(MarkdownEmailTest):
+            compute()
+        assert profiling.get_stats() is None
+        assert profiling.get_samples() == {}
+
+    def test_sample_rate(self, settings):
+        settings.EMARK = {"PROFILE_SAMPLE_RATE": 1}
+        for _ in range(2):
+            with profiling.profile(MarkdownEmailTest):
+                compute()
+        assert profiling.get_samples() == {"tests.test_message.MarkdownEmailTest": 2}
+        stats = profiling.get_stats("tests.test_message.MarkdownEmailTest")
+        assert any(func[2] == "fibonacci" for func in stats.stats)
+        assert profiling.get_stats("other") is None
+
+    def test_render(self, settings, email_message):
+        settings.EMARK = {"PROFILE_SAMPLE_RATE": 1}
+        email_message.render()
+        assert profiling.get_samples() == {"tests.test_message.MarkdownEmailTest": 1}
+        stats = profiling.get_stats()
+        assert any(func[2] == "inline_css" for func in stats.stats)
+
+
+class TestExport:
+    @pytest.fixture
+    def stats(self, settings):
+        settings.EMARK = {"PROFILE_SAMPLE_RATE": 1}
+        with profiling.profile(MarkdownEmailTest):
+            compute()
+        return profiling.get_stats()
+
+    def test_to_pstats(self, stats, tmp_path):
+        path = tmp_path / "emark.prof"
+        path.write_bytes(profiling.to_pstats(stats))
+        assert pstats.Stats(str(path)).stats == stats.stats
+
+    def test_to_collapsed(self, stats):
+        stacks = dict(
+            line.rsplit(" ", 1) for line in profiling.to_collapsed(stats).splitlines()
+        )
+        assert all(int(count) > 0 for count in stacks.values())
+        assert any(
+            "(compute);" in stack and stack.endswith("(fibonacci)") for stack in stacks
+        )
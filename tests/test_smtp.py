@@ -0,0 +1,244 @@
+import smtplib
+import socket
+import threading
+
+import pytest
+from django.core.mail import EmailMessage
+from emark import backends, smtp
+
+from tests.conftest import SMTPHandler, SMTPStandIn
+
+MESSAGE = b"Subject: Hello\r\n\r\n.Hi\r\n"
+RECIPIENTS = ["a@example.com", "b@example.com"]
+
+
+class ScriptedSMTPHandler(SMTPHandler):
+    """Reject recipients and reply to commands as scripted by the test."""
+
+    def handle_line(self, line):
+        command, _, argument = line.decode().partition(" ")
+        command = command.upper()
+        if command == "RCPT" and (
+            argument[3:].strip("<>") in self.server.rejected_recipients
+        ):
+            return b"550 No such user"
+        if reply := self.server.replies.get(command):
+            if reply.startswith(b"354"):
+                self.data = b""
+            return reply
+        return super().handle_line(line)
+
+    def handle_data(self, line):
+        reply = super().handle_data(line)
+        if reply and (end_of_data := self.server.replies.get(".")):
+            self.server.messages.pop()
+            return end_of_data
+        return reply
+
+    def reply(self, replies):
+        super().reply(replies)
+        if any(reply.startswith(b"421") for reply in replies):
+            self.request.shutdown(socket.SHUT_RDWR)
+
+
+class ScriptedSMTPStandIn(SMTPStandIn):
+    """SMTP stand-in that supports pipelining and scripted replies."""
+
+    def __init__(self):
+        super().__init__(extensions=["8BITMIME", "PIPELINING", "SIZE 0"])
+        self.RequestHandlerClass = ScriptedSMTPHandler
+        self.rejected_recipients = set()
+        self.replies = {}
+
+
+class CountingSMTP(smtp.PipeliningSMTP):
+    """Count the round trips, i.e. the replies awaited after sending."""
+
+    round_trips = 0
+    sent = False
+
+    def send(self, s):
+        self.sent = True
+        super().send(s)
+
+    def getreply(self):
+        if self.sent:
+            self.round_trips += 1
+            self.sent = False
+        return super().getreply()
+
+
+@pytest.fixture
+def smtp_server():
+    server = ScriptedSMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestPipeliningSMTP:
+    @pytest.fixture
+    def connection(self, smtp_server):
+        with CountingSMTP(smtp_server.host, smtp_server.port) as connection:
+            connection.ehlo()
+            connection.round_trips = 0
+            yield connection
+
+    def test_sendmail(self, smtp_server, connection):
+        assert connection.sendmail("from@example.com", RECIPIENTS, MESSAGE) == {}
+        assert connection.round_trips == 2
+        assert smtp_server.messages == [
+            {
+                "from": "<from@example.com> size=23",
+                "to": RECIPIENTS,
+                "data": MESSAGE,
+            }
+        ]
+
+    def test_sendmail__no_pipelining(self, smtp_server):
+        smtp_server.extensions = ["8BITMIME"]
+        with CountingSMTP(smtp_server.host, smtp_server.port) as connection:
+            connection.ehlo()
+            connection.round_trips = 0
+            connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+            assert connection.round_trips == 5
+            assert connection.message_size == len(MESSAGE)
+        assert smtp_server.messages[0]["to"] == RECIPIENTS
+
+    def test_sendmail__str(self, smtp_server, connection):
+        connection.sendmail("from@example.com", "a@example.com", "Hi\n.\n")
+        assert smtp_server.messages[0]["data"] == b"Hi\r\n.\r\n"
+        assert connection.message_size == 7
+
+    def test_sendmail__sender_refused(self, smtp_server, connection):
+        smtp_server.replies = {
+            "MAIL": b"550 Sender rejected",
+            "RCPT": b"503 Bad sequence of commands",
+            "DATA": b"503 Bad sequence of commands",
+        }
+        with pytest.raises(smtplib.SMTPSenderRefused) as e:
+            connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert e.value.smtp_code == 550
+        assert e.value.sender == "from@example.com"
+        assert not smtp_server.messages
+
+        # the transaction has been reset and the connection can be reused
+        smtp_server.replies = {}
+        connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert smtp_server.messages[0]["to"] == RECIPIENTS
+
+    def test_sendmail__recipient_refused(self, smtp_server, connection):
+        smtp_server.rejected_recipients = {"b@example.com"}
+        assert connection.sendmail("from@example.com", RECIPIENTS, MESSAGE) == {
+            "b@example.com": (550, b"No such user")
+        }
+        assert smtp_server.messages[0]["to"] == ["a@example.com"]
+
+    def test_sendmail__all_recipients_refused(self, smtp_server, connection):
+        smtp_server.rejected_recipients = set(RECIPIENTS)
+        with pytest.raises(smtplib.SMTPRecipientsRefused) as e:
+            connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert e.value.recipients == {
+            "a@example.com": (550, b"No such user"),
+            "b@example.com": (550, b"No such user"),
+        }
+        assert not smtp_server.messages
+
+        # the transaction has been reset and the connection can be reused
+        connection.sendmail("from@example.com", ["c@example.com"], MESSAGE)
+        assert smtp_server.messages[0]["to"] == ["c@example.com"]
+
+    def test_sendmail__all_recipients_refused__data_accepted(
+        self, smtp_server, connection
+    ):
+        smtp_server.rejected_recipients = set(RECIPIENTS)
+        smtp_server.replies = {"DATA": b"354 End data with <CR><LF>.<CR><LF>"}
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        # the data has been ended without any content
+        assert smtp_server.messages == [
+            {"from": "<from@example.com> size=23", "to": [], "data": b""}
+        ]
+
+        smtp_server.replies = {}
+        connection.sendmail("from@example.com", ["c@example.com"], MESSAGE)
+        assert smtp_server.messages[-1]["to"] == ["c@example.com"]
+
+    def test_sendmail__data_refused(self, smtp_server, connection):
+        smtp_server.replies = {"DATA": b"554 Transaction failed"}
+        with pytest.raises(smtplib.SMTPDataError) as e:
+            connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert e.value.smtp_code == 554
+        assert not smtp_server.messages
+
+        smtp_server.replies = {}
+        connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert smtp_server.messages[0]["to"] == RECIPIENTS
+
+    def test_sendmail__message_refused(self, smtp_server, connection):
+        smtp_server.replies = {".": b"552 Message size exceeds limit"}
+        with pytest.raises(smtplib.SMTPDataError) as e:
+            connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert e.value.smtp_code == 552
+        assert not smtp_server.messages
+
+        smtp_server.replies = {}
+        connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert smtp_server.messages[0]["to"] == RECIPIENTS
+
+    def test_sendmail__sender_service_not_available(self, smtp_server, connection):
+        smtp_server.replies = {"MAIL": b"421 Service not available"}
+        with pytest.raises(smtplib.SMTPSenderRefused) as e:
+            connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert e.value.smtp_code == 421
+        assert connection.sock is None
+
+    def test_sendmail__recipient_service_not_available(self, smtp_server, connection):
+        smtp_server.replies = {"RCPT": b"421 Service not available"}
+        with pytest.raises(smtplib.SMTPRecipientsRefused) as e:
+            connection.sendmail("from@example.com", RECIPIENTS, MESSAGE)
+        assert e.value.recipients == {"a@example.com": (421, b"Service not available")}
+        assert connection.sock is None
+
+
+class TestPipeliningEmailBackend:
+    def test_connection_class(self):
+        assert (
+            backends.SMTPEmailBackend(host="localhost").connection_class
+            is smtp.PipeliningSMTP
+        )
+        assert (
+            backends.TrackingSMTPEmailBackend(
+                host="localhost", use_ssl=True
+            ).connection_class
+            is smtp.PipeliningSMTPSSL
+        )
+
+    @pytest.mark.parametrize(
+        "extensions, round_trips",
+        [
+            (["PIPELINING"], 1 + 3 * 2),
+            ([], 1 + 3 * 5),
+        ],
+    )
+    def test_send_messages__round_trips(self, smtp_server, extensions, round_trips):
+        class TestBackend(backends.SMTPEmailBackend):
+            connection_class = CountingSMTP
+
+        smtp_server.extensions = extensions
+        smtp_server.latency = 0.01
+        backend = TestBackend(host=smtp_server.host, port=smtp_server.port)
+        messages = [
+            EmailMessage(body="Hi", to=["a@example.com", f"{i}@example.com"])
+            for i in range(3)
+        ]
+        backend.open()
+        try:
+            assert backend.send_messages(messages) == 3
+            # EHLO and the transactions
+            assert backend.connection.round_trips == round_trips
+        finally:
+            backend.close()
+        assert len(smtp_server.messages) == 3
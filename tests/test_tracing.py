@@ -0,0 +1,108 @@
+import uuid
+
+import pytest
+from django.urls import reverse
+from django.utils.http import urlencode
+from emark import backends, tracing, tracking
+from model_bakery import baker
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry import trace  # noqa: E402
+from opentelemetry.sdk.trace import TracerProvider  # noqa: E402
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor  # noqa: E402
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (  # noqa: E402
+    InMemorySpanExporter,
+)
+
+
+@pytest.fixture(scope="session")
+def exporter():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    return exporter
+
+
+@pytest.fixture
+def spans(exporter):
+    exporter.clear()
+    yield lambda: {span.name: span for span in exporter.get_finished_spans()}
+    exporter.clear()
+
+
+def test_start_span(spans):
+    with tracing.start_span("test", {"foo": "bar", "none": None}) as span:
+        assert span.is_recording()
+    assert spans()["test"].attributes == {"foo": "bar"}
+
+
+def test_start_span__not_installed(monkeypatch, spans):
+    monkeypatch.setattr(tracing, "trace", None)
+    with tracing.start_span("test", {"foo": "bar"}) as span:
+        assert not span.is_recording()
+        span.set_attribute("foo", "baz")
+    assert spans() == {}
+
+
+def test_render(email_message, spans):
+    email_message.render()
+    finished = spans()
+    render = finished["emark.render"]
+    assert render.attributes == {
+        "emark.email": "MarkdownEmailTest",
+        "emark.language": "en-US",
+    }
+    for stage in ["template", "utm", "markdown", "layout", "inline", "text"]:
+        assert finished[f"emark.render.{stage}"].parent.span_id == (
+            render.context.span_id
+        )
+
+
+@pytest.mark.django_db
+def test_send(email_message, spans, smtp_server):
+    email_message.to = ["peter.parker@avengers.com", "dr.strange@avengers.com"]
+    backend = backends.SMTPEmailBackend(host=smtp_server.host, port=smtp_server.port)
+    assert backend.send_messages([email_message]) == 1
+    send = spans()["emark.send"]
+    assert send.attributes["emark.recipients"] == 2
+    assert send.attributes["emark.size"] == len(smtp_server.messages[0]["data"])
+
+
+@pytest.mark.django_db
+def test_send__tracking(email_message, spans, smtp_server):
+    backend = backends.TrackingSMTPEmailBackend(
+        host=smtp_server.host, port=smtp_server.port
+    )
+    assert backend.send_messages([email_message]) == 1
+    finished = spans()
+    assert "emark.render" in finished
+    assert finished["emark.send"].attributes["emark.recipients"] == 1
+
+
+@pytest.mark.django_db
+def test_open(client, spans):
+    msg = baker.make("emark.Send")
+    client.get(reverse("emark:email-open", kwargs={"pk": msg.pk}))
+    assert spans()["emark.open"].attributes == {"emark.email_id": str(msg.pk)}
+
+
+@pytest.mark.django_db
+def test_click(client, spans):
+    msg = baker.make("emark.Send")
+    redirect_url = "https://external-domain.com/"
+    url = reverse("emark:email-click", kwargs={"pk": msg.pk})
+    query = urlencode(
+        {"url": redirect_url, "sig": tracking.sign_url(msg.pk, redirect_url)}
+    )
+    client.get(f"{url}?{query}")
+    finished = spans()
+    assert finished["emark.click"].attributes == {"emark.email_id": str(msg.pk)}
+    assert "emark.click.insert" in finished
+
+
+@pytest.mark.django_db
+def test_open__no_email(client, spans):
+    client.get(reverse("emark:email-open", kwargs={"pk": uuid.uuid4()}))
+    assert not spans()["emark.open"].status.is_ok
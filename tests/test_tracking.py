@@ -0,0 +1,76 @@
+from emark import tracking
+
+
+class TestCounter:
+    def test_incr_counter(self):
+        assert tracking.get_counter("foo") == 0
+        tracking.incr_counter("foo")
+        tracking.incr_counter("foo", 2)
+        assert tracking.get_counter("foo") == 3
+
+
+class TestIsDuplicate:
+    def test_disabled(self, rf):
+        request = rf.get("/")
+        assert not tracking.is_duplicate(request, "open", 1)
+        assert not tracking.is_duplicate(request, "open", 1)
+        assert tracking.get_counter("open:suppressed") == 0
+
+    def test_window(self, rf, settings):
+        settings.EMARK = {"TRACKING_DEDUPLICATION_WINDOW": 60}
+        request = rf.get("/", HTTP_USER_AGENT="Mozilla/5.0")
+        assert not tracking.is_duplicate(request, "open", 1)
+        assert tracking.is_duplicate(request, "open", 1)
+        assert tracking.get_counter("open:suppressed") == 1
+
+    def test_window__different_keys(self, rf, settings):
+        settings.EMARK = {"TRACKING_DEDUPLICATION_WINDOW": 60}
+        request = rf.get("/", HTTP_USER_AGENT="Mozilla/5.0")
+        assert not tracking.is_duplicate(request, "open", 1)
+        assert not tracking.is_duplicate(request, "click", 1)
+        assert not tracking.is_duplicate(request, "open", 2)
+        assert not tracking.is_duplicate(request, "click", 1, "https://example.com")
+        other_request = rf.get("/", HTTP_USER_AGENT="GoogleImageProxy")
+        assert not tracking.is_duplicate(other_request, "open", 1)
+        assert tracking.get_counter("open:suppressed") == 0
+
+
+def reject_all(request):
+    return True
+
+
+class TestIsFiltered:
+    def test_no_filters(self, rf):
+        assert not tracking.is_filtered(rf.get("/"), "open")
+
+    def test_user_agent(self, rf, settings):
+        settings.EMARK = {"TRACKING_IGNORED_USER_AGENTS": ["barracuda", r"^curl/"]}
+        assert tracking.is_filtered(
+            rf.get("/", HTTP_USER_AGENT="Barracuda Sentinel (EE)"), "open"
+        )
+        assert tracking.is_filtered(rf.get("/", HTTP_USER_AGENT="curl/8.0"), "open")
+        assert not tracking.is_filtered(
+            rf.get("/", HTTP_USER_AGENT="Mozilla/5.0 curl/8.0"), "open"
+        )
+        assert tracking.get_counter("open:filtered") == 0
+
+    def test_ip_prefix(self, rf, settings):
+        settings.EMARK = {
+            "TRACKING_IGNORED_IP_PREFIXES": ["10.0.0.0/8", "2001:db8::/32"]
+        }
+        assert tracking.is_filtered(rf.get("/", REMOTE_ADDR="10.1.2.3"), "open")
+        assert tracking.is_filtered(rf.get("/", REMOTE_ADDR="2001:db8::1"), "open")
+        assert not tracking.is_filtered(rf.get("/", REMOTE_ADDR="127.0.0.1"), "open")
+        assert not tracking.is_filtered(rf.get("/", REMOTE_ADDR="unknown"), "open")
+
+    def test_custom_filter(self, rf, settings):
+        settings.EMARK = {"TRACKING_FILTERS": ["tests.test_tracking.reject_all"]}
+        assert tracking.is_filtered(rf.get("/"), "open")
+
+    def test_count(self, rf, settings):
+        settings.EMARK = {
+            "TRACKING_FILTERS": ["tests.test_tracking.reject_all"],
+            "TRACKING_FILTER_ACTION": "count",
+        }
+        assert tracking.is_filtered(rf.get("/"), "click")
+        assert tracking.get_counter("click:filtered") == 1
@@ -110,3 +110,51 @@ class TestHTML2TextParser:
             "--------------------------------------------------\n"
             "some footer"
         )
+
+
+class TestMinifyHTML:
+    def test_minify_html(self):
+        html = (
+            "<html>\n  <head>\n    <!-- comment -->\n"
+            "    <!--[if mso]><style>td{}</style><![endif]-->\n"
+            "    <style>\n      /* base */\n      body { color: red; }\n    </style>\n"
+            "  </head>\n  <body>\n    <p>Hello   <b>World</b> <i>!</i></p>\n"
+            "    <pre>  keep\n    this  </pre>\n  </body>\n</html>\n"
+        )
+        assert utils.minify_html(html) == (
+            "<html>\n<head>\n"
+            "<!--[if mso]><style>td{}</style><![endif]-->\n"
+            "<style>body{color: red;}</style>\n"
+            "</head>\n<body>\n<p>Hello <b>World</b> <i>!</i></p>\n"
+            "<pre>  keep\n    this  </pre>\n</body>\n</html>"
+        )
+
+
+class TestWrapLines:
+    def test_wrap_lines(self):
+        html = f'<p style="color: red; margin: 0">{"word " * 10}</p>'
+        assert utils.wrap_lines(html, limit=20) == (
+            '<p style="color: red; margin: 0">word\n'
+            "word word word word\nword word word word\nword </p>"
+        )
+
+    def test_wrap_lines__attributes(self):
+        html = '<img alt="a b c" src="x.png"> text'
+        assert utils.wrap_lines(html, limit=20) == '<img alt="a b c"\nsrc="x.png"> text'
+
+    def test_wrap_lines__unbreakable(self):
+        html = f'<a href="https://example.com/{"a" * 50}">link</a>'
+        assert utils.wrap_lines(html, limit=20) == html
+
+    def test_wrap_lines__short_lines(self):
+        html = "<p>a b c</p>\n<p>d e f</p>"
+        assert utils.wrap_lines(html, limit=20) == html
+
+    def test_wrap_lines__preformatted(self):
+        html = f"<pre>{'a ' * 20}</pre> {'b ' * 10}"
+        assert utils.wrap_lines(html, limit=20) == (
+            f"<pre>{'a ' * 20}</pre> b b b b b b b b b b\n"
+        )
+
+    def test_wrap_lines__multibyte(self):
+        assert utils.wrap_lines("ä ä ä", limit=4) == "ä\nä\nä"
@@ -1,12 +1,37 @@
+import os
+import subprocess
+import sys
 import uuid
+from pathlib import Path
 
 import pytest
 from django.urls import reverse
 from django.utils.http import urlencode
-from emark import models
+from emark import metrics, models, tracking, views
 from model_bakery import baker
 
 
+def test_import__rendering_dependencies():
+    """Tracking-only workers shouldn't pay for importing the rendering stack."""
+    code = (
+        "import sys, django;"
+        "django.setup();"
+        "import emark.views, emark.urls, emark.backends;"
+        "print(','.join(sorted("
+        "{'markdown', 'premailer', 'cssutils', 'lxml'} & sys.modules.keys()"
+        ")))"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+        cwd=Path(__file__).resolve().parent.parent,
+        env=os.environ | {"DJANGO_SETTINGS_MODULE": "tests.testapp.settings"},
+    )
+    assert result.stdout.strip() == ""
+
+
 class TestEmailDetailView:
     @pytest.mark.django_db
     def test_get(self, client):
@@ -121,9 +146,179 @@ class TestEmailClickView:
         email_click = models.Click.objects.get()
         assert email_click.email == msg
         assert email_click.redirect_url == "http://testserver/?utm_source=foo"
-        assert email_click.headers == {"Cookie": ""}
+        assert email_click.headers == {}
         assert email_click.ip_address == "127.0.0.1"
         assert email_click.utm == {}
+        msg.refresh_from_db()
+        assert msg.click_count == 1
+        assert msg.last_clicked_at == email_click.created_at
+
+    @pytest.mark.django_db
+    def test_get__filtered(self, client, settings, django_assert_num_queries):
+        settings.EMARK = {"TRACKING_IGNORED_USER_AGENTS": ["GoogleImageProxy"]}
+        url = reverse("emark:email-click", kwargs={"pk": uuid.uuid4()})
+        url = f"{url}?{urlencode({'url': '/some/path'})}"
+        with django_assert_num_queries(0):
+            response = client.get(url, HTTP_USER_AGENT="GoogleImageProxy")
+        assert response.status_code == 302
+        assert response["Location"] == "/some/path"
+
+    @pytest.mark.django_db
+    def test_get__duplicate(self, client, live_server, settings):
+        settings.EMARK = {"TRACKING_DEDUPLICATION_WINDOW": 60}
+        msg = baker.make("emark.Send")
+        redirect_url = "http://testserver/?utm_source=foo"
+
+        url = reverse("emark:email-click", kwargs={"pk": msg.pk})
+
+        url = f"{url}?{urlencode({'url': redirect_url})}"
+        assert client.get(url).status_code == 302
+        response = client.get(url)
+        assert response.status_code == 302
+        assert response["Location"] == redirect_url
+        assert models.Click.objects.count() == 1
+        assert tracking.get_counter("click:suppressed") == 1
+
+
+class TestEmailClickViewSigned:
+    @pytest.mark.django_db
+    def test_get(self, rf):
+        msg = baker.make("emark.Send")
+        redirect_url = "https://external-domain.com/?utm_source=foo"
+        signature = tracking.sign_url(msg.pk, redirect_url)
+        request = rf.get("/", {"url": redirect_url, "sig": signature})
+
+        response = views.EmailClickView.as_view()(request, pk=msg.pk)
+        assert response.status_code == 302
+        assert response["Location"] == redirect_url
+        assert not models.Click.objects.exists()
+
+        response.close()
+        email_click = models.Click.objects.get()
+        assert email_click.email == msg
+        assert email_click.redirect_url == redirect_url
+
+    @pytest.mark.django_db
+    def test_get__client(self, client):
+        msg = baker.make("emark.Send")
+        redirect_url = "https://external-domain.com/"
+        url = reverse("emark:email-click", kwargs={"pk": msg.pk})
+        query = urlencode(
+            {"url": redirect_url, "sig": tracking.sign_url(msg.pk, redirect_url)}
+        )
+        response = client.get(f"{url}?{query}")
+        assert response.status_code == 302
+        assert response["Location"] == redirect_url
+        assert models.Click.objects.get().email == msg
+
+    @pytest.mark.django_db
+    def test_get__invalid_signature(self, client):
+        msg = baker.make("emark.Send")
+        redirect_url = "https://external-domain.com/"
+        url = reverse("emark:email-click", kwargs={"pk": msg.pk})
+        query = urlencode(
+            {"url": redirect_url, "sig": tracking.sign_url(msg.pk, "/other")}
+        )
+        response = client.get(f"{url}?{query}")
+        assert response.status_code == 400
+        assert not models.Click.objects.exists()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_get__unknown_email(self, client, caplog):
+        pk = uuid.uuid4()
+        redirect_url = "https://external-domain.com/"
+        url = reverse("emark:email-click", kwargs={"pk": pk})
+        query = urlencode(
+            {"url": redirect_url, "sig": tracking.sign_url(pk, redirect_url)}
+        )
+        response = client.get(f"{url}?{query}")
+        assert response.status_code == 302
+        assert not models.Click.objects.exists()
+        assert "Click on unknown email" in caplog.text
+
+    def test_get__filtered(self, rf, settings):
+        settings.EMARK = {"TRACKING_IGNORED_USER_AGENTS": ["GoogleImageProxy"]}
+        pk = uuid.uuid4()
+        redirect_url = "https://external-domain.com/"
+        request = rf.get(
+            "/",
+            {"url": redirect_url, "sig": tracking.sign_url(pk, redirect_url)},
+            HTTP_USER_AGENT="GoogleImageProxy",
+        )
+        response = views.EmailClickView.as_view()(request, pk=pk)
+        assert response.status_code == 302
+        assert response.callbacks == []
+
+    @pytest.mark.django_db(transaction=True)
+    def test_get__metrics(self, client, settings):
+        settings.EMARK = {
+            "METRICS": "emark.metrics.InMemoryMetrics",
+            "TRACKING_IGNORED_USER_AGENTS": ["GoogleImageProxy"],
+        }
+        pk = uuid.uuid4()
+        redirect_url = "https://external-domain.com/"
+        url = reverse("emark:email-click", kwargs={"pk": pk})
+        query = urlencode(
+            {"url": redirect_url, "sig": tracking.sign_url(pk, redirect_url)}
+        )
+        client.get(f"{url}?{query}")
+        client.get(f"{url}?{query}", HTTP_USER_AGENT="GoogleImageProxy")
+        sink = metrics.get_metrics()
+        assert sink.get_counter("tracking_events", event="click", status="unknown") == 1
+        assert (
+            sink.get_counter("tracking_events", event="click", status="filtered") == 1
+        )
+
+
+class TestEmailLinkClickView:
+    @pytest.mark.django_db
+    def test_get(self, client, django_assert_num_queries):
+        msg = baker.make("emark.Send")
+        link = baker.make("emark.Link", url="https://external-domain.com/")
+        url = reverse(
+            "emark:email-link",
+            kwargs={"pk": msg.pk, "link": tracking.sign_link(msg.pk, link.short_id)},
+        )
+        response = client.get(url)
+        assert response.status_code == 302
+        assert response["Location"] == "https://external-domain.com/"
+        email_click = models.Click.objects.get()
+        assert email_click.email == msg
+        assert email_click.link == link
+        assert email_click.redirect_url == "https://external-domain.com/"
+
+        # the link is cached in memory
+        with django_assert_num_queries(0):
+            assert views.get_link_url(link.short_id) == link.url
+
+    @pytest.mark.django_db
+    def test_get__other_email(self, client):
+        msg = baker.make("emark.Send", campaign="RESET")
+        link = baker.make(
+            "emark.Link", campaign="RESET", url="https://example.com/reset/secret/"
+        )
+        token = tracking.sign_link(msg.pk, link.short_id)
+        for pk, link_token in [
+            (uuid.uuid4(), token),
+            (uuid.uuid4(), link.short_id),
+            (msg.pk, link.short_id),
+            (msg.pk, f"{link.short_id}-"),
+        ]:
+            url = reverse("emark:email-link", kwargs={"pk": pk, "link": link_token})
+            assert client.get(url).status_code == 404
+        assert not models.Click.objects.exists()
+
+    @pytest.mark.django_db
+    def test_get__unknown_link(self, client):
+        pk = uuid.uuid4()
+        url = reverse(
+            "emark:email-link", kwargs={"pk": pk, "link": tracking.sign_link(pk, "zz")}
+        )
+        assert client.get(url).status_code == 404
+
+    def test_get__invalid_link(self, client):
+        url = reverse("emark:email-link", kwargs={"pk": uuid.uuid4(), "link": "-"})
+        assert client.get(url).status_code == 404
 
 
 class TestEmailOpenView:
@@ -144,6 +339,48 @@ class TestEmailOpenView:
 
         email_open = models.Open.objects.get()
         assert email_open.email == msg
-        assert email_open.headers == {"Cookie": ""}
+        assert email_open.headers == {}
         assert email_open.ip_address == "127.0.0.1"
         assert email_open.utm == {}
+        msg.refresh_from_db()
+        assert msg.open_count == 1
+        assert msg.first_opened_at == email_open.created_at
+
+    @pytest.mark.django_db
+    def test_get__metrics(self, client, settings):
+        settings.EMARK = {
+            "METRICS": "emark.metrics.InMemoryMetrics",
+            "TRACKING_DEDUPLICATION_WINDOW": 60,
+        }
+        msg = baker.make("emark.Send")
+        url = reverse("emark:email-open", kwargs={"pk": msg.pk})
+        assert client.get(url).status_code == 200
+        assert client.get(url).status_code == 200
+        sink = metrics.get_metrics()
+        assert sink.get_counter("tracking_events", event="open", status="tracked") == 1
+        assert (
+            sink.get_counter("tracking_events", event="open", status="duplicate") == 1
+        )
+        histogram = sink.get_histogram("tracking_insert_duration_seconds", event="open")
+        assert histogram.count == 1
+
+    @pytest.mark.django_db
+    def test_get__duplicate(self, client, settings):
+        settings.EMARK = {"TRACKING_DEDUPLICATION_WINDOW": 60}
+        msg = baker.make("emark.Send")
+        url = reverse("emark:email-open", kwargs={"pk": msg.pk})
+        assert client.get(url).status_code == 200
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/gif"
+        assert models.Open.objects.count() == 1
+        assert tracking.get_counter("open:suppressed") == 1
+
+    @pytest.mark.django_db
+    def test_get__filtered(self, client, settings, django_assert_num_queries):
+        settings.EMARK = {"TRACKING_IGNORED_IP_PREFIXES": ["127.0.0.0/8"]}
+        url = reverse("emark:email-open", kwargs={"pk": uuid.uuid4()})
+        with django_assert_num_queries(0):
+            response = client.get(url)
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/gif"
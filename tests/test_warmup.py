@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+from django.apps import apps
+from emark import warmup
+from emark.contrib.dashboard import _registry
+
+from tests.test_message import MarkdownEmailTest
+
+
+class BrokenEmail(MarkdownEmailTest):
+    template = "does-not-exist.md"
+
+
+def test_warmup(settings):
+    settings.LANGUAGES = [("en", "English"), ("de", "German")]
+    _registry["MarkdownEmailTest"] = MarkdownEmailTest
+    try:
+        assert warmup.warmup() == (1, 2)
+    finally:
+        del _registry["MarkdownEmailTest"]
+    spec = MarkdownEmailTest.get_spec()
+    assert "template" in spec.__dict__
+    assert "base_template" in spec.__dict__
+
+
+def test_warmup__broken(caplog):
+    assert warmup.warmup(email_classes=[BrokenEmail], languages=["en"]) == (0, 1)
+    assert "Failed to warm up" in caplog.text
+
+
+def test_warmup__i18n_off(settings):
+    settings.USE_I18N = False
+    assert warmup.warmup(email_classes=[]) == (0, 0)
+
+
+def test_warmup__no_dashboard(settings):
+    settings.INSTALLED_APPS = [
+        app for app in settings.INSTALLED_APPS if app != "emark.contrib.dashboard"
+    ]
+    assert warmup.get_email_classes() == []
+
+
+@patch("emark.warmup.warmup")
+def test_ready(warmup_mock, settings):
+    app_config = apps.get_app_config("emark")
+    app_config.ready()
+    warmup_mock.assert_not_called()
+    settings.EMARK = {"WARMUP": True}
+    app_config.ready()
+    warmup_mock.assert_called_once_with()
+    settings.EMARK = {"WARMUP": "yes"}
+    app_config.ready()
+    warmup_mock.assert_called_once_with()
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from emark import (
+    admin as emark_admin,
+    models,
+)
+
+admin.site.register(models.Send, emark_admin.SendAdmin)
+admin.site.register(models.Open, emark_admin.OpenAdmin)
+admin.site.register(models.Click, emark_admin.ClickAdmin)
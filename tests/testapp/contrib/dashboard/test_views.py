@@ -1,5 +1,6 @@
 import pytest
 from django.http import Http404
+from emark import profiling
 from emark.contrib.dashboard import _registry, views
 from emark.message import MarkdownEmail
 
@@ -15,7 +16,7 @@ def test_serialize_email_class():
         "detail_url": "/emark/dashboard/path/preview",
         "doc": "",
         "name": "MarkdownEmailTest",
-        "preview": MarkdownEmailTest.render_preview,
+        "preview_url": "/emark/dashboard/path/preview.html",
     }
 
 
@@ -30,6 +31,7 @@ class TestDashboardView:
             "site_title": "eMark",
             "title": "Dashboard",
             "emails": [],
+            "profiles": {},
             "view": view,
         }
 
@@ -72,7 +74,7 @@ class TestEmailPreviewView:
                 "name": "MarkdownEmailTest",
                 "doc": "",
                 "detail_url": "/emark/dashboard/MarkdownEmailTest/preview",
-                "preview": MarkdownEmailTest.render_preview,
+                "preview_url": "/emark/dashboard/MarkdownEmailTest/preview.html",
             },
         }
 
@@ -83,3 +85,71 @@ class TestEmailPreviewView:
         response = admin_client.get("/emark/dashboard/MarkdownEmailTest/preview")
         assert response.status_code == 200
         del _registry["MarkdownEmailTest"]
+
+
+class TestEmailPreviewHTMLView:
+    @pytest.fixture(autouse=True)
+    def _register(self):
+        _registry["MarkdownEmailTest"] = MarkdownEmailTest
+        yield
+        del _registry["MarkdownEmailTest"]
+
+    def test_get(self, admin_client):
+        response = admin_client.get("/emark/dashboard/MarkdownEmailTest/preview.html")
+        assert response.status_code == 200
+        assert response["X-Frame-Options"] == "SAMEORIGIN"
+        assert response.content.decode() == MarkdownEmailTest.render_preview()
+
+    def test_get__404(self, admin_client):
+        response = admin_client.get("/emark/dashboard/path/preview.html")
+        assert response.status_code == 404
+
+    def test_get__language_404(self, admin_client):
+        response = admin_client.get(
+            "/emark/dashboard/MarkdownEmailTest/preview.html", {"language": "xx"}
+        )
+        assert response.status_code == 404
+
+    def test_get__staff_only(self, client):
+        response = client.get("/emark/dashboard/MarkdownEmailTest/preview.html")
+        assert response.status_code == 302
+
+
+class TestProfileView:
+    @pytest.fixture
+    def profiled(self, settings):
+        settings.EMARK = {"PROFILE_SAMPLE_RATE": 1}
+        with profiling.profile(MarkdownEmailTest):
+            sum(range(100))
+        yield
+        profiling.reset_stats()
+
+    def test_get__404(self, admin_client):
+        response = admin_client.get("/emark/dashboard/profile")
+        assert response.status_code == 404
+
+    def test_get__pstats(self, admin_client, profiled):
+        response = admin_client.get("/emark/dashboard/profile")
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/octet-stream"
+        assert response.content == profiling.to_pstats(profiling.get_stats())
+
+    def test_get__collapsed(self, admin_client, profiled):
+        response = admin_client.get(
+            "/emark/dashboard/profile",
+            {
+                "email": "tests.testapp.contrib.dashboard.test_views.MarkdownEmailTest",
+                "format": "collapsed",
+            },
+        )
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/plain; charset=utf-8"
+        assert b"builtins.sum" in response.content
+
+    def test_get__staff_only(self, client, profiled):
+        response = client.get("/emark/dashboard/profile")
+        assert response.status_code == 302
+
+    def test_dashboard(self, admin_client, profiled):
+        response = admin_client.get("/emark/dashboard/")
+        assert b"MarkdownEmailTest (1 samples)" in response.content
@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractBaseUser, AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -8,3 +8,18 @@ class TestUser(AbstractUser):
     language = models.TextField(
         _("language"), choices=settings.LANGUAGES, default=settings.LANGUAGE_CODE
     )
+
+
+class ContactUser(AbstractBaseUser):
+    """User model without an active flag and with a custom email field."""
+
+    email_address = models.EmailField(unique=True)
+    name = models.TextField(blank=True)
+
+    EMAIL_FIELD = USERNAME_FIELD = "email_address"
+
+    def get_full_name(self):
+        return self.name
+
+    def get_short_name(self):
+        return self.name